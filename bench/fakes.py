@@ -0,0 +1,300 @@
+"""Stand-ins for Discord and the model API used by the benchmark harness.
+
+They implement just enough of discord.py's and google-generativeai's surface
+for the real cogs to run against them, with configurable latency.
+"""
+
+import asyncio
+import contextlib
+import datetime
+import itertools
+import json
+import random
+import re
+
+import discord
+
+BOT_ID = 1000
+
+_snowflakes = itertools.count(1_000_000)
+
+
+def next_id():
+    return next(_snowflakes)
+
+
+# --- Model ---
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeStream:
+    def __init__(self, chunks, chunk_delay):
+        self._chunks = chunks
+        self._chunk_delay = chunk_delay
+
+    async def __aiter__(self):
+        for chunk in self._chunks:
+            await asyncio.sleep(self._chunk_delay)
+            yield FakeResponse(chunk)
+
+
+class FakeModel:
+    """Mimics genai.GenerativeModel with configurable latency and failures."""
+
+    def __init__(self, name, latency=0.5, jitter=0.2, failure_rate=0.0, chunks=8):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.chunks = chunks
+        self.calls = 0
+        self.failures = 0
+
+    def _answer(self, prompt):
+        if "--- QUESTIONS ---" in prompt:
+            # A micro-batched prompt: answer every question ID as JSON.
+            ids = re.findall(r'"id": "(q\d+)"', prompt)
+            return [json.dumps({id: f"Benchmark answer to {id}." for id in ids})]
+        words = (
+            f"This is a benchmark answer to a {len(prompt)} character prompt.".split()
+        )
+        return [" ".join(words) + " " for _ in range(self.chunks)]
+
+    async def generate_content_async(self, prompt, stream=False):
+        self.calls += 1
+        delay = max(0.0, random.gauss(self.latency, self.jitter * self.latency))
+        if random.random() < self.failure_rate:
+            self.failures += 1
+            await asyncio.sleep(delay / 2)
+            raise RuntimeError("Simulated model failure")
+        chunks = self._answer(prompt)
+        if stream:
+            # Roughly a third of the time goes to the first token.
+            await asyncio.sleep(delay / 3)
+            return FakeStream(chunks, delay * 2 / 3 / len(chunks))
+        await asyncio.sleep(delay)
+        return FakeResponse("".join(chunks))
+
+
+# --- Discord ---
+class FakeHTTPResponse:
+    status = 404
+    reason = "Not Found"
+
+
+class FakeWorld:
+    """Shared state for the fake Discord layer: channels, messages, REST calls."""
+
+    def __init__(self, rest_latency=0.05):
+        self.rest_latency = rest_latency
+        self.rest_calls = 0
+        self.channels = {}
+        self.bot_user = FakeUser(BOT_ID, "historiabot", bot=True)
+
+    async def rest(self):
+        self.rest_calls += 1
+        await asyncio.sleep(self.rest_latency)
+
+
+class FakeUser:
+    def __init__(self, id, name, bot=False):
+        self.id = id
+        self.name = name
+        self.display_name = name
+        self.bot = bot
+        self.mention = f"<@{id}>"
+
+    def __eq__(self, other):
+        return getattr(other, "id", None) == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def mentioned_in(self, message):
+        return message.mention_everyone or any(
+            user.id == self.id for user in message.mentions
+        )
+
+
+class FakeGuild:
+    def __init__(self, id):
+        self.id = id
+
+
+class FakeReference:
+    def __init__(self, message, resolved=True):
+        self.message_id = message.id
+        self.resolved = message if resolved else None
+        self.cached_message = None
+
+
+class FakeMessage:
+    def __init__(self, channel, author, content="", embeds=None, reference=None):
+        self.id = next_id()
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.content = content or ""
+        self.embeds = list(embeds or [])
+        self.reference = reference
+        self.mention_everyone = False
+        self.mentions = [
+            user
+            for user in (channel.world.bot_user,)
+            if user.mention in self.content or f"<@!{user.id}>" in self.content
+        ]
+        self.created_at = discord.utils.utcnow()
+
+    async def reply(self, content=None, **kwargs):
+        return await self.channel.send(content, reference=self, **kwargs)
+
+    async def edit(self, content=discord.utils.MISSING, embed=None, **kwargs):
+        await self.channel.world.rest()
+        if content is not discord.utils.MISSING:
+            self.content = content or ""
+        if embed is not None:
+            self.embeds = [embed]
+        return self
+
+    async def delete(self):
+        await self.channel.world.rest()
+        self.channel.messages.pop(self.id, None)
+
+    async def create_thread(self, name, auto_archive_duration=None):
+        await self.channel.world.rest()
+        return FakeThread(self.channel.world, name, self.channel, id=self.id)
+
+
+class _MessageableMixin:
+    def _setup(self, world, name, guild, id=None):
+        self.world = world
+        self.name = name
+        self.id = id or next_id()
+        self.guild = guild
+        self.messages = {}
+        world.channels[self.id] = self
+
+    def post(self, author, content, reference=None):
+        """Adds a message as if a user had sent it (no REST call)."""
+        message = FakeMessage(self, author, content, reference=reference)
+        self.messages[message.id] = message
+        return message
+
+    async def send(
+        self, content=None, *, embed=None, embeds=None, reference=None, **kwargs
+    ):
+        await self.world.rest()
+        embeds = embeds or ([embed] if embed is not None else [])
+        message = FakeMessage(
+            self,
+            self.world.bot_user,
+            content,
+            embeds=embeds,
+            reference=FakeReference(reference) if reference is not None else None,
+        )
+        self.messages[message.id] = message
+        return message
+
+    @contextlib.asynccontextmanager
+    async def typing(self):
+        await self.world.rest()
+        yield
+
+    async def fetch_message(self, id):
+        await self.world.rest()
+        try:
+            return self.messages[id]
+        except KeyError:
+            raise discord.NotFound(FakeHTTPResponse(), "Unknown Message") from None
+
+    async def history(self, limit=100, after=None, oldest_first=None):
+        await self.world.rest()
+        messages = sorted(self.messages.values(), key=lambda m: m.id)
+        if after is not None:
+            messages = [m for m in messages if m.id > after.id]
+        if not oldest_first and after is None:
+            messages.reverse()
+        for message in messages[:limit] if limit else messages:
+            yield message
+
+
+class FakeChannel(_MessageableMixin):
+    def __init__(self, world, name, guild):
+        self._setup(world, name, guild)
+
+
+class FakeThread(_MessageableMixin, discord.Thread):
+    """Passes isinstance(channel, discord.Thread) checks."""
+
+    parent = None
+    owner_id = None
+
+    def __init__(self, world, name, parent, id=None):
+        self._setup(world, name, parent.guild, id=id)
+        self.parent = parent
+        self.parent_id = parent.id
+        self.owner_id = world.bot_user.id
+
+
+class FakeBot:
+    """The parts of commands.Bot the cogs use."""
+
+    def __init__(self, world):
+        self.world = world
+        self.user = world.bot_user
+        self.latency = 0.05
+
+    def get_channel(self, id):
+        return self.world.channels.get(id)
+
+    async def fetch_channel(self, id):
+        await self.world.rest()
+        return self.world.channels[id]
+
+    async def wait_until_ready(self):
+        return
+
+
+class FakeInteractionResponse:
+    def __init__(self, interaction):
+        self._interaction = interaction
+
+    async def defer(self, thinking=False, ephemeral=False):
+        await self._interaction.world.rest()
+
+    async def send_message(self, content=None, **kwargs):
+        await self._interaction.world.rest()
+        self._interaction.original = FakeMessage(
+            self._interaction.channel, self._interaction.world.bot_user, content
+        )
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self._interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        return await self._interaction.channel.send(content, **kwargs)
+
+
+class FakeInteraction:
+    def __init__(self, world, channel, user):
+        self.id = next_id()
+        self.world = world
+        self.channel = channel
+        self.channel_id = channel.id
+        self.guild = channel.guild
+        self.guild_id = channel.guild.id
+        self.user = user
+        self.created_at = datetime.datetime.now(datetime.timezone.utc)
+        self.response = FakeInteractionResponse(self)
+        self.followup = FakeFollowup(self)
+        self.original = None
+
+    async def edit_original_response(self, content=discord.utils.MISSING, **kwargs):
+        if self.original is None:
+            await self.world.rest()
+            self.original = FakeMessage(self.channel, self.world.bot_user)
+        return await self.original.edit(content=content, **kwargs)
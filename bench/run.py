@@ -0,0 +1,348 @@
+"""Offline load test for the bot's hot paths.
+
+Drives the real Events, Study and Tasks cogs against a fake Discord layer and
+a fake model, then reports latency percentiles, throughput and event-loop
+blocking. Run from the project root:
+
+    python -m bench.run --requests 2000 --concurrency 200
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import statistics
+import tempfile
+import time
+
+SCENARIOS = (
+    "chatter",
+    "mention",
+    "reply",
+    "summarize",
+    "ask",
+    "outline",
+    "pomodoro",
+    "commits",
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000, help="per scenario")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--model-latency", type=float, default=0.5, help="seconds")
+    parser.add_argument("--model-failure-rate", type=float, default=0.0)
+    parser.add_argument("--model-concurrency", type=int, default=32)
+    parser.add_argument("--rest-latency", type=float, default=0.05, help="seconds")
+    parser.add_argument(
+        "--distinct-questions",
+        type=int,
+        default=200,
+        help="size of the /ask and /outline prompt pool (smaller means more cache hits)",
+    )
+    parser.add_argument("--debate-length", type=int, default=300)
+    parser.add_argument(
+        "--batch-window",
+        type=float,
+        default=0.0,
+        help="seconds to collect short questions into one model call (0 disables)",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+def configure_environment(args):
+    """Points runtime state at a scratch directory and lifts per-user limits."""
+    data_dir = tempfile.mkdtemp(prefix="historiabot-bench-")
+    os.environ["DATA_DIR"] = data_dir
+    os.environ["DATABASE_PATH"] = os.path.join(data_dir, "bench.db")
+    os.environ["MODEL_MAX_CONCURRENCY"] = str(args.model_concurrency)
+    os.environ["ADMISSION_USER_RATE"] = "1000000"
+    os.environ["ADMISSION_USER_BURST"] = "1000000"
+    os.environ["ADMISSION_GUILD_RATE"] = "1000000"
+    os.environ["ADMISSION_GUILD_BURST"] = "1000000"
+    os.environ["ADMISSION_MAX_QUEUE"] = str(max(args.requests, args.concurrency) * 2)
+    os.environ.setdefault("STREAM_EDIT_INTERVAL", "0.25")
+    os.environ["BATCH_WINDOW"] = str(args.batch_window)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class LoopMonitor:
+    """Samples how late the event loop wakes up to estimate blocking time."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        self._task.cancel()
+
+
+class Bench:
+    def __init__(self, args):
+        from bench import fakes
+        from cogs import tasks as tasks_module
+        from cogs.events import Events
+        from cogs.study import Study
+        from utils.model import ModelGateway, set_gateway
+
+        self.args = args
+        self.fakes = fakes
+        self.world = fakes.FakeWorld(rest_latency=args.rest_latency)
+        self.models = []
+
+        def model_factory(name):
+            model = fakes.FakeModel(
+                name,
+                latency=args.model_latency,
+                failure_rate=args.model_failure_rate,
+            )
+            self.models.append(model)
+            return model
+
+        set_gateway(ModelGateway(model_factory=model_factory))
+        self.bot = fakes.FakeBot(self.world)
+        self.events = Events(self.bot)
+        self.study = Study(self.bot)
+        self.tasks_module = tasks_module
+        self.tasks = tasks_module.Tasks(self.bot)
+
+        self.guild = fakes.FakeGuild(fakes.next_id())
+        self.channels = [
+            fakes.FakeChannel(self.world, name, self.guild)
+            for name in ("history", "ap-world", "math", "general", "debate-hall")
+        ]
+        self.users = [
+            fakes.FakeUser(fakes.next_id(), f"student{i}") for i in range(500)
+        ]
+
+    @property
+    def model_calls(self):
+        return sum(model.calls for model in self.models)
+
+    @property
+    def model_failures(self):
+        return sum(model.failures for model in self.models)
+
+    def _mention(self):
+        return f"<@{self.bot.user.id}>"
+
+    async def setup(self):
+        await self.events.cog_load()
+        await self.study.cog_load()
+        # A debate thread the bot started, for the summarize scenario.
+        hall = self.channels[-1]
+        starter = await hall.send("Debate: benchmarking")
+        self.thread = await starter.create_thread(name="Debate: benchmarking")
+        for i in range(self.args.debate_length):
+            self.thread.post(random.choice(self.users), f"Argument number {i}.")
+        # A bot message in each channel to reply to.
+        self.bot_messages = [
+            await channel.send("Earlier answer.") for channel in self.channels
+        ]
+
+        tasks_module = self.tasks_module
+        tasks_module.CHANGELOG_CHANNEL_ID = self.channels[0].id
+        tasks_module.GITHUB_REPOS = [f"bench/repo{i}" for i in range(3)]
+        self.tasks.github = FakePoller()
+
+    async def teardown(self):
+        await self.study.cog_unload()
+
+    # --- Scenarios ---
+    async def chatter(self, i):
+        # Ordinary channel traffic the bot should ignore without any I/O.
+        channel = random.choice(self.channels)
+        author = random.choice(self.users)
+        if i % 2:
+            message = channel.post(author, f"just chatting {i}")
+        else:
+            other = channel.post(random.choice(self.users), "something said earlier")
+            reference = self.fakes.FakeReference(other, resolved=i % 4 == 0)
+            reference.cached_message = other
+            message = channel.post(author, f"replying {i}", reference=reference)
+        await self.events.on_message(message)
+
+    async def mention(self, i):
+        channel = random.choice(self.channels)
+        message = channel.post(
+            random.choice(self.users), f"{self._mention()} tell me about topic {i}"
+        )
+        await self.events.on_message(message)
+
+    async def reply(self, i):
+        original = random.choice(self.bot_messages)
+        message = original.channel.post(
+            random.choice(self.users),
+            f"what about follow-up {i}?",
+            reference=self.fakes.FakeReference(original, resolved=i % 2 == 0),
+        )
+        await self.events.on_message(message)
+
+    async def summarize(self, i):
+        self.thread.post(random.choice(self.users), f"New argument {i}.")
+        message = self.thread.post(
+            random.choice(self.users), f"{self._mention()} summarize"
+        )
+        await self.events.on_message(message)
+
+    def _interaction(self):
+        return self.fakes.FakeInteraction(
+            self.world, random.choice(self.channels), random.choice(self.users)
+        )
+
+    async def ask(self, i):
+        question = (
+            f"What happened in year {random.randrange(self.args.distinct_questions)}?"
+        )
+        await self.study.ask_command.callback(self.study, self._interaction(), question)
+
+    async def outline(self, i):
+        prompt = f"Essay prompt {random.randrange(self.args.distinct_questions)}"
+        await self.study.outline_command.callback(
+            self.study, self._interaction(), prompt
+        )
+
+    async def pomodoro(self, i):
+        interaction = self._interaction()
+        for command in (self.study.pomodoro_start, self.study.pomodoro_status):
+            await command.callback(self.study, interaction)
+        await self.study.pomodoro_stop.callback(self.study, interaction)
+
+    async def commits(self, i):
+        await self.tasks.check_for_new_commits()
+
+    async def run_scenario(self, name):
+        handler = getattr(self, name)
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+        latencies = []
+        errors = 0
+
+        async def one(i):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    await handler(i)
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        rest_before = self.world.rest_calls
+        model_before = self.model_calls
+        failures_before = self.model_failures
+        monitor = LoopMonitor()
+        monitor.start()
+        started = time.perf_counter()
+        # The cogs log progress with print(); keep the report readable.
+        with contextlib.redirect_stdout(io.StringIO()):
+            await asyncio.gather(*(one(i) for i in range(self.args.requests)))
+        elapsed = time.perf_counter() - started
+        monitor.stop()
+
+        return {
+            "scenario": name,
+            "requests": self.args.requests,
+            "errors": errors,
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "throughput": self.args.requests / elapsed if elapsed else 0.0,
+            "loop_max_lag": max(monitor.lags, default=0.0),
+            "loop_blocked": sum(monitor.lags),
+            "rest_calls": self.world.rest_calls - rest_before,
+            "model_calls": self.model_calls - model_before,
+            "model_failures": self.model_failures - failures_before,
+        }
+
+
+class FakePoller:
+    """Returns a handful of fake commits per repo on every poll."""
+
+    def __init__(self, commits_per_poll=12):
+        self.commits_per_poll = commits_per_poll
+
+    async def fetch_new_commits(self, repo):
+        await asyncio.sleep(0.05)
+        commits = [
+            {
+                "sha": f"{random.getrandbits(160):040x}",
+                "html_url": f"https://github.com/{repo}/commit/{n}",
+                "commit": {
+                    "author": {"name": "bench"},
+                    "message": f"feat: benchmark commit {n}\n\nDetails.",
+                },
+            }
+            for n in range(self.commits_per_poll)
+        ]
+        return commits, (commits[0]["sha"], None)
+
+    async def save_cursor(self, repo, cursor):
+        pass
+
+    async def close(self):
+        pass
+
+
+def print_report(results):
+    header = f"{'scenario':<10} {'reqs':>6} {'errs':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'REST':>7} {'model':>6} {'failed':>6} {'max lag ms':>10} {'blocked ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['scenario']:<10} {r['requests']:>6} {r['errors']:>5} "
+            f"{r['p50'] * 1000:>8.1f} {r['p95'] * 1000:>8.1f} {r['p99'] * 1000:>8.1f} "
+            f"{r['throughput']:>8.1f} {r['rest_calls']:>7} {r['model_calls']:>6} "
+            f"{r['model_failures']:>6} {r['loop_max_lag'] * 1000:>10.1f} {r['loop_blocked'] * 1000:>10.1f}"
+        )
+
+
+async def main(args):
+    random.seed(args.seed)
+    bench = Bench(args)
+    await bench.setup()
+    results = []
+    try:
+        for name in args.scenarios.split(","):
+            name = name.strip()
+            if name not in SCENARIOS:
+                print(f"!!! WARNING: Unknown scenario '{name}', skipping.")
+                continue
+            results.append(await bench.run_scenario(name))
+    finally:
+        await bench.teardown()
+    print_report(results)
+    print(
+        "\nerrs: unhandled exceptions; failed: model calls that raised (the cogs answer those with an error reply)."
+    )
+    print(
+        f"\nMean p50 across scenarios: {statistics.mean(r['p50'] for r in results) * 1000:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    configure_environment(arguments)
+    asyncio.run(main(arguments))
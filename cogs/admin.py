@@ -0,0 +1,172 @@
+import asyncio
+import os
+import tracemalloc
+
+from discord.ext import commands
+
+from cogs.events import NOTES_PERSONAS
+from utils.admission import get_admission_scheduler
+from utils.cache import get_cache
+from utils.memory import LOW_MEMORY, rss_bytes, start_tracing, top_allocations
+from utils.model import get_gateway
+from utils.notes import NOTES_DIR, get_notes_index
+from utils.render import split_text
+from utils.routing import get_router
+from utils.singleflight import get_singleflight
+from utils.tracing import get_tracer
+
+
+class Admin(commands.Cog):
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.cache = get_cache()
+        self.model = get_gateway()
+        self.router = get_router()
+        self.inflight = get_singleflight()
+        self.recaps = get_singleflight("recap")
+        self.admission = get_admission_scheduler()
+
+    @commands.command()
+    @commands.is_owner()
+    async def cache_stats(self, ctx: commands.Context):
+        """Shows response cache hit/miss counters."""
+        stats = self.cache.stats()
+        await ctx.send(
+            f"**Response cache**\n"
+            f"Memory hits: {stats['memory_hits']}\n"
+            f"Disk hits: {stats['disk_hits']}\n"
+            f"Misses: {stats['misses']}\n"
+            f"Hit rate: {stats['hit_rate']:.1%}\n"
+            f"Entries in memory: {stats['memory_entries']}"
+        )
+
+    @commands.command()
+    @commands.is_owner()
+    async def model_stats(self, ctx: commands.Context):
+        """Shows model concurrency, request coalescing and per-tier and circuit breaker counters."""
+        total = self.inflight.leaders + self.inflight.coalesced
+        saved = self.inflight.coalesced / total if total else 0.0
+        tiers = "".join(
+            f"Tier `{name}` ({tier['model']}): {self.router.requests[name]} calls, "
+            f"{self.router.fallbacks[name]} fell back, "
+            f"~{self.router.tokens[name]} tokens\n"
+            for name, tier in self.router.tiers.items()
+        )
+        breakers = "".join(
+            f"Breaker `{model}`: {breaker.state} "
+            f"({breaker.failures} failures, {breaker.rejected} rejected)\n"
+            for model, breaker in self.router.breakers.items()
+        )
+        await ctx.send(
+            f"**Model calls**\n"
+            f"In flight: {self.model.in_flight}/{self.model.max_concurrency}\n"
+            f"Generations started: {self.inflight.leaders}\n"
+            f"Requests coalesced: {self.inflight.coalesced} ({saved:.1%} of requests)\n"
+            f"Debate recaps: {self.recaps.leaders} written, "
+            f"{self.recaps.coalesced} shared\n"
+            f"Queued now: {self.admission.queue_depth}\n"
+            f"Admitted: {self.admission.admitted} "
+            f"(queued first: {self.admission.queued})\n"
+            f"Rate limited: {self.admission.rate_limited}\n"
+            f"Shed under load: {self.admission.shed}\n"
+            f"{tiers}"
+            f"{breakers}"
+        )
+
+    @commands.command()
+    @commands.is_owner()
+    async def purge_cache(self, ctx: commands.Context, persona: str = None):
+        """Purges cached responses, optionally only for one persona (ask, outline)."""
+        removed = await self.cache.purge(persona)
+        scope = f" for `{persona}`" if persona else ""
+        await ctx.send(f"Purged {removed} cached response(s){scope}.", delete_after=10)
+
+    @commands.command()
+    @commands.is_owner()
+    async def ingest_notes(self, ctx: commands.Context, persona: str = None):
+        """Indexes the course notes in NOTES_DIR/<persona> (all personas by default)."""
+        personas = [persona] if persona else list(NOTES_PERSONAS)
+        for name in personas:
+            if name not in NOTES_PERSONAS:
+                await ctx.send(
+                    f"`{name}` doesn't use course notes. Choose from: {', '.join(NOTES_PERSONAS)}."
+                )
+                continue
+            directory = os.path.join(NOTES_DIR, name)
+            if not os.path.isdir(directory):
+                await ctx.send(f"No notes folder found at `{directory}`.")
+                continue
+            async with ctx.typing():
+                added, removed, unchanged = await get_notes_index(name).ingest(
+                    directory
+                )
+            await ctx.send(
+                f"**{name} notes**: {added} passage(s) added, {removed} removed, {unchanged} unchanged."
+            )
+
+    @commands.command()
+    @commands.is_owner()
+    async def slow_traces(self, ctx: commands.Context, count: int = 5):
+        """Shows the slowest recent requests and where their time went."""
+        tracer = get_tracer()
+        traces = tracer.slowest(max(1, min(count, 20)))
+        if not traces:
+            await ctx.send("No requests have been traced yet.")
+            return
+        lines = [
+            f"**Slowest of the last {len(tracer.recent)} requests** "
+            f"({tracer.kept} written to disk, {tracer.dropped} dropped)"
+        ]
+        for trace in traces:
+            path = trace.attrs.get("path", trace.name)
+            error = f", failed: {trace.error}" if trace.error else ""
+            spans = sorted(trace.spans, key=lambda span: span["ms"], reverse=True)
+            breakdown = ", ".join(
+                f"{span['name']} {span['ms']:.0f} ms" for span in spans[:5]
+            )
+            lines.append(
+                f"`{trace.id}` {path}: **{trace.duration * 1000:.0f} ms**{error}\n"
+                f"↳ {breakdown or 'no spans'}"
+            )
+        for chunk in split_text("\n".join(lines)):
+            await ctx.send(chunk)
+
+    @commands.command()
+    @commands.is_owner()
+    async def memory_top(self, ctx: commands.Context, count: int = 10):
+        """Shows memory use and the lines that have allocated the most since tracing began."""
+        rss = rss_bytes()
+        lines = [
+            f"**Memory** ({'low-memory mode' if LOW_MEMORY else 'default caching'})\n"
+            f"Resident: {f'{rss / 2**20:.1f} MiB' if rss else 'unknown'}\n"
+            f"Guilds: {len(self.bot.guilds)}, cached users: {len(self.bot.users)}, "
+            f"cached messages: {len(self.bot.cached_messages)}"
+        ]
+        if start_tracing():
+            lines.append(
+                "Started tracing allocations. Run this command again after some traffic to see the top allocators."
+            )
+        else:
+            top = await asyncio.to_thread(top_allocations, max(1, min(count, 25)))
+            current, peak = tracemalloc.get_traced_memory()
+            lines.append(
+                f"Traced: {current / 2**20:.1f} MiB now, {peak / 2**20:.1f} MiB at peak"
+            )
+            lines.extend(
+                f"`{size / 1024:.0f} KiB` in {blocks} block(s): `{where}`"
+                for where, size, blocks in top
+            )
+        for chunk in split_text("\n".join(lines)):
+            await ctx.send(chunk)
+
+    async def cog_command_error(self, ctx: commands.Context, error):
+        if isinstance(error, commands.NotOwner):
+            await ctx.send(
+                "Sorry, only the bot owner can use this command.", delete_after=10
+            )
+        else:
+            await ctx.send(f"An error occurred: {error}", delete_after=10)
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Admin(bot))
@@ -1,9 +1,24 @@
+import contextlib
 import os
+import time
 
 import discord
-import google.generativeai as genai
 from discord.ext import commands
 
+from utils import metrics, tracing
+from utils.admission import AdmissionError, get_admission_scheduler
+from utils.batching import get_batcher
+from utils.conversation import get_conversation_store
+from utils.debates import get_debate_index
+from utils.config import env_float
+from utils.model import MODEL_NAME
+from utils.notes import get_notes_index
+from utils.resilience import friendly_error
+from utils.routing import get_router
+from utils.singleflight import get_singleflight
+from utils.streaming import StreamingReply
+from utils.summaries import get_summary_store
+
 PERSONAS = {
     "history": "You are an expert history tutor for history students.",
     "ap-world": "You are an expert history tutor for AP World History students.",
@@ -13,78 +28,356 @@ PERSONAS = {
 }
 DEFAULT_PERSONA = "You are a friendly and helpful AI assistant."
 
+# Personas whose answers are grounded in the course notes under NOTES_DIR/<persona>.
+NOTES_PERSONAS = ("history", "ap-world")
+
+# Model tiers the personas and commands are routed to. A tier that times out
+# or runs out of quota hands the request to its fallback tier.
+MODEL_TIERS = {
+    "fast": {
+        "model": os.getenv("MODEL_FAST", "gemma-3-4b-it"),
+        "timeout": env_float("MODEL_FAST_TIMEOUT", 20.0),
+        "fallback": "large",
+    },
+    "large": {
+        "model": os.getenv("MODEL_LARGE", MODEL_NAME),
+        "timeout": None,
+        "fallback": "fast",
+    },
+}
+PERSONA_TIERS = {
+    "history": "large",
+    "ap-world": "large",
+    "math": "large",
+    "general": "fast",
+    "debate-hall": "large",
+}
+COMMAND_TIERS = {
+    "ask": "fast",
+    "outline": "large",
+    "debate": "large",
+    "summarize": "large",
+}
+
+# Debate messages folded into the rolling summary per model call.
+SUMMARY_BATCH_SIZE = 100
+
+
+def build_summary_prompt(previous_summary, transcript_lines):
+    transcript = "\n".join(transcript_lines)
+    if not previous_summary:
+        return f"""
+You are a neutral debate moderator AI. Your one and only task right now is to summarize the following debate transcript.
+Read the transcript carefully and provide a concise, unbiased summary of the main arguments. Do not add any conversational fluff, greetings, or ask for more information. Just provide the summary.
+
+--- DEBATE TRANSCRIPT ---
+{transcript}
+--- END TRANSCRIPT ---
+"""
+    return f"""
+You are a neutral debate moderator AI. Your one and only task right now is to update your running summary of a debate.
+
+--- SUMMARY SO FAR ---
+{previous_summary}
+--- END SUMMARY ---
+
+--- NEW MESSAGES ---
+{transcript}
+--- END NEW MESSAGES ---
+
+Fold the new messages into the summary so far and provide a concise, unbiased summary of the main arguments of the whole debate. Do not add any conversational fluff, greetings, or ask for more information. Just provide the summary.
+"""
+
 
 class Events(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.model = genai.GenerativeModel("gemma-3-27b-it")
+        self.model = get_router()
+        self.summaries = get_summary_store()
+        self.conversations = get_conversation_store()
+        self.admission = get_admission_scheduler()
+        self.recaps = get_singleflight("recap")
+        self.batcher = get_batcher()
+        self.debates = get_debate_index()
+        self.notes = {persona: get_notes_index(persona) for persona in NOTES_PERSONAS}
+
+    async def cog_load(self):
+        # Notes indexes load on their first search, keeping NumPy off the
+        # startup path.
+        await self.debates.load()
 
     @commands.Cog.listener()
     async def on_ready(self):
         print(f"Logged in as {self.bot.user.name} ({self.bot.user.id})")
         print("Bot is online with thread-based debate features.")
-        print("Syncing slash commands...")
-        await self.bot.tree.sync()
-        print("Slash commands synced successfully.")
         print("----------------------------------------------------")
 
+    async def summarize_debate(self, thread: discord.Thread):
+        """Posts a recap of the debate, summarizing only messages since the last one.
+
+        Messages are read lazily and folded into the summary a batch at a
+        time; progress is saved after each batch, so a failure partway
+        through a long thread doesn't throw away the batches already folded.
+        """
+        summary, last_message_id = await self.summaries.get(thread.id)
+        after = discord.Object(id=last_message_id) if last_message_id else None
+        tier = self.model.tier_for(command="summarize")
+
+        lines = []
+        async for msg in thread.history(limit=None, after=after, oldest_first=True):
+            skip = (
+                not msg.content
+                or (msg.author == self.bot.user and msg.embeds)
+                # Asking for a recap isn't part of the debate.
+                or self._is_recap_request(msg)
+            )
+            if not skip and len(lines) == SUMMARY_BATCH_SIZE:
+                # More messages follow this batch, so fold it in now; the
+                # last batch is streamed into the recap below.
+                summary = await self.model.generate(
+                    build_summary_prompt(summary, lines), tier=tier
+                )
+                await self.summaries.save(thread.id, summary, last_message_id)
+                lines = []
+            last_message_id = msg.id
+            if not skip:
+                lines.append(f"- {msg.author.display_name}: {msg.content}")
+
+        if not lines and not summary:
+            await thread.send("There's nothing to summarize yet.")
+            return
+
+        reply = StreamingReply(
+            thread.send,
+            embed=lambda text, index: discord.Embed(
+                title="Summary of the Debate" if index == 0 else None,
+                description=text,
+                color=discord.Color.gold(),
+            ),
+        )
+
+        if not lines:
+            await reply.feed(summary)
+            await reply.finish()
+        else:
+            summary = await reply.consume(
+                self.model.stream(build_summary_prompt(summary, lines), tier=tier)
+            )
+        await self.summaries.save(thread.id, summary, last_message_id)
+
+    def _is_recap_request(self, message: discord.Message):
+        """Whether a message asks the bot to summarize (or recap) the debate."""
+        if not self.bot.user.mentioned_in(message):
+            return False
+        cleaned = (
+            message.content.replace(f"<@!{self.bot.user.id}>", "")
+            .replace(f"<@{self.bot.user.id}>", "")
+            .strip()
+            .lower()
+        )
+        return cleaned.startswith("summarize") or cleaned.startswith("recap")
+
+    def _cached_reference(self, message: discord.Message):
+        """Returns the message being replied to, if it is known without an API call."""
+        resolved = message.reference.resolved
+        if isinstance(resolved, discord.Message):
+            return resolved
+        return message.reference.cached_message
+
+    def _classify(self, message: discord.Message):
+        """Decides from local state alone whether a message concerns the bot.
+
+        Returns "drop" if it can be ignored, "accept" if it should be handled,
+        or "escalate" if only fetching the replied-to message can tell.
+        """
+        if self.bot.user.mentioned_in(message):
+            return "accept"
+        if not (message.reference and message.reference.message_id):
+            return "drop"
+        if isinstance(message.reference.resolved, discord.DeletedReferencedMessage):
+            return "drop"
+
+        turn = self.conversations.get(message.channel.id, message.reference.message_id)
+        if turn is not None:
+            return "accept" if turn.role == "assistant" else "drop"
+        original_message = self._cached_reference(message)
+        if original_message is not None:
+            return "accept" if original_message.author == self.bot.user else "drop"
+        return "escalate"
+
+    async def _is_debate_thread(self, thread: discord.Thread):
+        """Whether the bot opened `thread` for a debate, fetching only as a last resort."""
+        if thread.id in self.debates:
+            return True
+        if thread.owner_id is not None:
+            # Debate threads are created from the bot's message, so it owns them.
+            return thread.owner_id == self.bot.user.id
+
+        try:
+            with tracing.span("discord.fetch_message", kind="thread starter"):
+                parent_message = await thread.parent.fetch_message(thread.id)
+        except discord.NotFound:
+            return False
+        if parent_message.author != self.bot.user:
+            return False
+        await self.debates.add(thread.id, thread.guild.id)
+        return True
+
+    async def _study_notes(self, persona, question):
+        """Returns a prompt section with the notes passages most relevant to `question`."""
+        index = self.notes.get(persona)
+        if index is None or not question:
+            return ""
+        try:
+            with tracing.span("notes.search", persona=persona):
+                passages = await index.search(question)
+        except Exception as e:
+            print(f"!!! WARNING: Could not search the {persona} notes: {e!r}")
+            return ""
+        if not passages:
+            return ""
+        excerpts = "\n---\n".join(f"[{source}]\n{text}" for _, source, text in passages)
+        return f"Use these excerpts from the course notes where they are relevant:\n---\n{excerpts}\n---"
+
+    async def _reply_chain(self, message: discord.Message):
+        """Returns the conversation turns a reply continues, if the bot is part of it.
+
+        Turns come from the in-memory conversation store; the referenced message
+        is only looked up through Discord on a cache miss.
+        """
+        reference_id = message.reference.message_id
+        turn = self.conversations.get(message.channel.id, reference_id)
+        if turn is None:
+            original_message = self._cached_reference(message)
+            if original_message is None:
+                try:
+                    with tracing.span("discord.fetch_message", kind="reference"):
+                        original_message = await message.channel.fetch_message(
+                            reference_id
+                        )
+                except discord.NotFound:
+                    return []
+            if original_message.author != self.bot.user:
+                return []
+
+            original_text = original_message.content
+            if original_message.embeds and original_message.embeds[0].description:
+                original_text += "\n" + original_message.embeds[0].description
+            self.conversations.record(
+                message.channel.id,
+                original_message.id,
+                self.bot.user.id,
+                "assistant",
+                original_text,
+            )
+        elif turn.role != "assistant":
+            return []
+        return self.conversations.chain(message.channel.id, reference_id)
+
+    @contextlib.asynccontextmanager
+    async def _admitted(self, message: discord.Message, check=True):
+        """Waits for the admission scheduler, posting a notice while queued.
+
+        Pass `check=False` if the requester's rate limit was already checked.
+        """
+        notice = None
+
+        async def notify(position):
+            nonlocal notice
+            notice = await message.reply(
+                f"⏳ I'm a bit busy right now, you're #{position} in line.",
+                mention_author=False,
+            )
+
+        if check:
+            admitted = self.admission.admit(
+                message.author.id,
+                message.guild.id if message.guild else None,
+                message.channel.id,
+                on_queued=notify,
+            )
+        else:
+            admitted = self.admission.slot(message.channel.id, on_queued=notify)
+        async with admitted:
+            if notice is not None:
+                try:
+                    await notice.delete()
+                except discord.HTTPException:
+                    pass
+            yield
+
+    def _remember_reply(self, message: discord.Message, reply, text):
+        """Records the bot's reply messages as turns answering `message`."""
+        for sent in reply.messages:
+            self.conversations.record(
+                message.channel.id,
+                sent.id,
+                self.bot.user.id,
+                "assistant",
+                text,
+                parent_id=message.id,
+            )
+
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
         if message.author == self.bot.user:
             return
+        started = time.perf_counter()
 
+        verdict = self._classify(message)
+        if verdict == "drop":
+            metrics.MESSAGE_FILTER.inc(result="dropped")
+            return
+        metrics.MESSAGE_FILTER.inc(
+            result="escalated" if verdict == "escalate" else "accepted"
+        )
+
+        with tracing.trace(
+            "message",
+            message_id=message.id,
+            channel_id=message.channel.id,
+            guild_id=message.guild.id if message.guild else None,
+        ):
+            await self._handle_message(message, started)
+
+    async def _handle_message(self, message: discord.Message, started):
+        """Handles a message the fast path let through: summaries, debates and replies."""
         if isinstance(message.channel, discord.Thread) and self.bot.user.mentioned_in(
             message
         ):
             try:
-                parent_message = await message.channel.parent.fetch_message(
-                    message.channel.id
-                )
-                if parent_message.author == self.bot.user:
-                    cleaned_input_thread = (
-                        message.content.replace(f"<@!{self.bot.user.id}>", "")
-                        .replace(f"<@{self.bot.user.id}>", "")
-                        .strip()
-                        .lower()
-                    )
+                if await self._is_debate_thread(message.channel):
+                    if self._is_recap_request(message):
+                        await self.admission.check(
+                            message.author.id,
+                            message.guild.id if message.guild else None,
+                        )
+
+                        async def recap():
+                            async with message.channel.typing(), self._admitted(
+                                message, check=False
+                            ):
+                                await self.summarize_debate(message.channel)
 
-                    if cleaned_input_thread.startswith(
-                        "summarize"
-                    ) or cleaned_input_thread.startswith("recap"):
-                        async with message.channel.typing():
-                            history = [
-                                msg
-                                async for msg in message.channel.history(
-                                    limit=100, oldest_first=True
-                                )
-                            ]
-
-                            transcript = "--- DEBATE TRANSCRIPT ---\n"
-                            for msg in history:
-                                if not (msg.author == self.bot.user and msg.embeds):
-                                    if msg.content:
-                                        transcript += f"- {msg.author.display_name}: {msg.content}\n"
-
-                            summary_prompt = f"""
-                            You are a neutral debate moderator AI. Your one and only task right now is to summarize the following debate transcript.
-                            Read the transcript carefully and provide a concise, unbiased summary of the main arguments. Do not add any conversational fluff, greetings, or ask for more information. Just provide the summary.
-
-                            {transcript}
-                            --- END TRANSCRIPT ---
-                            """
-                            response = self.model.generate_content(summary_prompt)
-                            summary_embed = discord.Embed(
-                                title="Summary of the Debate",
-                                description=response.text,
-                                color=discord.Color.gold(),
-                            )
-                            await message.channel.send(embed=summary_embed)
+                        # Recaps requested while one is being written share it
+                        # rather than re-summarizing the same messages.
+                        await self.recaps.do(message.channel.id, recap)
+                        tracing.annotate(path="summarize")
+                        metrics.MESSAGE_LATENCY.observe(
+                            time.perf_counter() - started, path="summarize"
+                        )
                         return
             except discord.NotFound:
                 pass
+            except AdmissionError as e:
+                await message.reply(str(e), mention_author=False)
+                return
             except Exception as e:
+                print(
+                    f"!!! ERROR: Could not summarize thread {message.channel.id}: {e!r}"
+                )
                 await message.channel.send(
-                    f"An error occurred while trying to summarize: {e}"
+                    f"Sorry, I couldn't summarize the debate. {friendly_error(e)}"
                 )
                 return
 
@@ -95,14 +388,13 @@ class Events(commands.Cog):
         user_input = message.content
 
         if message.reference and message.reference.message_id:
-            original_message = await message.channel.fetch_message(
-                message.reference.message_id
-            )
-            if original_message.author == self.bot.user:
-                original_text = original_message.content
-                if original_message.embeds:
-                    original_text += "\n" + original_message.embeds[0].description
-                context_prompt = f"You are in a conversation. This was your previous message:\n---\n{original_text}\n---\nNow, the user has replied."
+            chain = await self._reply_chain(message)
+            if chain:
+                history = "\n".join(
+                    f"{'You' if turn.role == 'assistant' else 'User'}: {turn.content}"
+                    for turn in chain
+                )
+                context_prompt = f"You are in a conversation. Here is the conversation so far, oldest message first:\n---\n{history}\n---\nNow, the user has replied."
                 user_input = (
                     user_input.replace(f"<@!{self.bot.user.id}>", "")
                     .replace(f"<@{self.bot.user.id}>", "")
@@ -117,6 +409,15 @@ class Events(commands.Cog):
                     .strip()
                 )
 
+                self.conversations.record(
+                    message.channel.id,
+                    message.id,
+                    message.author.id,
+                    "user",
+                    cleaned_input,
+                    parent_id=message.reference.message_id if context_prompt else None,
+                )
+
                 if cleaned_input.lower().startswith("debate"):
                     topic = cleaned_input.lower().replace("debate", "", 1).strip()
                     if not topic:
@@ -124,38 +425,111 @@ class Events(commands.Cog):
                             "Please provide a topic for the debate! Example: `@historiabot debate The effectiveness of the League of Nations`"
                         )
                         return
-                    try:
-                        debate_prompt = f"Generate a brief, neutral introduction and two opposing opening statements for a debate on the topic: '{topic}'."
-                        response = self.model.generate_content(debate_prompt)
-
-                        embed = discord.Embed(
-                            title=f"Debate Topic: {topic.title()}",
-                            description=response.text,
-                            color=discord.Color.dark_gold(),
-                        )
-                        embed.set_footer(text="Join the thread below to participate!")
+                    await self.start_debate(message, topic)
+                    tracing.annotate(path="debate")
+                    metrics.MESSAGE_LATENCY.observe(
+                        time.perf_counter() - started, path="debate"
+                    )
+                    return
+
+                await self.respond(
+                    message, channel_name, persona_prompt, cleaned_input, context_prompt
+                )
+                path = "reply" if context_prompt else "mention"
+                tracing.annotate(path=path)
+                metrics.MESSAGE_LATENCY.observe(
+                    time.perf_counter() - started, path=path
+                )
 
-                        debate_starter_message = await message.reply(embed=embed)
+    async def start_debate(self, message: discord.Message, topic):
+        """Posts opening statements for a debate and opens a thread for it."""
+        try:
+            debate_prompt = f"Generate a brief, neutral introduction and two opposing opening statements for a debate on the topic: '{topic}'."
 
-                        thread_name = f"Debate: {topic[:80]}"
-                        await debate_starter_message.create_thread(
-                            name=thread_name, auto_archive_duration=1440
-                        )
-                    except Exception as e:
-                        await message.reply(
-                            f"Sorry, I had trouble starting the debate. Error: {e}"
-                        )
-                    return
+            def debate_embed(text, index):
+                embed = discord.Embed(
+                    title=f"Debate Topic: {topic.title()}" if index == 0 else None,
+                    description=text,
+                    color=discord.Color.dark_gold(),
+                )
+                if index == 0:
+                    embed.set_footer(text="Join the thread below to participate!")
+                return embed
 
-                final_prompt = f'{persona_prompt}\n{context_prompt}\nThe user\'s message to you is: "{cleaned_input}"\nAnalyze their message and respond helpfully.'
-                try:
-                    response = self.model.generate_content(final_prompt)
-                    await message.reply(response.text, mention_author=True)
-                except Exception as e:
-                    await message.reply(
-                        f"Sorry, I encountered an error trying to respond. {e}",
-                        mention_author=True,
+            reply = StreamingReply(
+                message.reply, send_more=message.channel.send, embed=debate_embed
+            )
+            async with self._admitted(message):
+                debate_text = await reply.consume(
+                    self.model.stream(
+                        debate_prompt, tier=self.model.tier_for(command="debate")
+                    )
+                )
+            self._remember_reply(message, reply, debate_text)
+            debate_starter_message = reply.messages[0]
+
+            thread_name = f"Debate: {topic[:80]}"
+            with tracing.span("discord.create_thread"):
+                thread = await debate_starter_message.create_thread(
+                    name=thread_name, auto_archive_duration=1440
+                )
+            await self.debates.add(thread.id, thread.guild.id)
+        except AdmissionError as e:
+            await message.reply(str(e))
+        except Exception as e:
+            print(f"!!! ERROR: Could not start a debate on '{topic}': {e!r}")
+            await message.reply(
+                f"Sorry, I had trouble starting the debate. {friendly_error(e)}"
+            )
+
+    async def respond(
+        self, message: discord.Message, persona, persona_prompt, question, context=""
+    ):
+        """Streams the model's answer to `question` as a reply to `message`.
+
+        Course notes for `persona` are only searched once the requester has
+        been admitted. Fresh questions (no reply `context`) that are short
+        enough go through the micro-batcher when batching is enabled.
+        """
+
+        def build_prompt(notes_prompt):
+            return f'{persona_prompt}\n{notes_prompt}\n{context}\nThe user\'s message to you is: "{question}"\nAnalyze their message and respond helpfully.'
+
+        tier = self.model.tier_for(persona=persona)
+        try:
+            reply = StreamingReply(
+                lambda **kwargs: message.reply(mention_author=True, **kwargs),
+                send_more=message.channel.send,
+            )
+            await self.admission.check(
+                message.author.id, message.guild.id if message.guild else None
+            )
+            if not context and self.batcher.accepts(question):
+                notes_prompt = await self._study_notes(persona, question)
+                response_text = await self.batcher.ask(
+                    f"{persona_prompt}\n{notes_prompt}".strip(),
+                    question,
+                    build_prompt(notes_prompt),
+                    tier,
+                    channel_id=message.channel.id,
+                )
+                await reply.feed(response_text)
+                await reply.finish()
+            else:
+                async with self._admitted(message, check=False):
+                    notes_prompt = await self._study_notes(persona, question)
+                    response_text = await reply.consume(
+                        self.model.stream(build_prompt(notes_prompt), tier=tier)
                     )
+            self._remember_reply(message, reply, response_text)
+        except AdmissionError as e:
+            await message.reply(str(e), mention_author=True)
+        except Exception as e:
+            print(f"!!! ERROR: Could not respond to message {message.id}: {e!r}")
+            await message.reply(
+                f"Sorry, I encountered an error trying to respond. {friendly_error(e)}",
+                mention_author=True,
+            )
 
 
 async def setup(bot: commands.Bot):
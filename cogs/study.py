@@ -1,15 +1,80 @@
-import asyncio
-
 import discord
-import google.generativeai as genai
 from discord import app_commands
 from discord.ext import commands
 
+from utils import tracing
+from utils.admission import AdmissionError, get_admission_scheduler
+from utils.batching import get_batcher
+from utils.cache import get_cache, make_key
+from utils.resilience import friendly_error
+from utils.routing import get_router
+from utils.singleflight import get_singleflight
+from utils.streaming import StreamingReply
+from utils.timers import get_timer_service
+
 
 class Study(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.model = genai.GenerativeModel("gemma-3-27b-it")
+        self.model = get_router()
+        self.cache = get_cache()
+        self.inflight = get_singleflight()
+        self.admission = get_admission_scheduler()
+        self.batcher = get_batcher()
+        self.timers = get_timer_service()
+
+    async def _respond_cached(
+        self, interaction, reply, persona, key_text, prompt, batch_instructions=None
+    ):
+        """Sends a response for `key_text`, reusing cached or in-flight answers.
+
+        Concurrent requests for the same normalized prompt share a single
+        generation: the first one waits for an admission slot and streams it,
+        the rest are answered with its result. With `batch_instructions`, a
+        short `key_text` may instead be answered through the micro-batcher.
+        """
+        tier = self.model.tier_for(command=persona)
+        model_name = self.model.model_for(tier)
+        with tracing.span("cache.get"):
+            cached = await self.cache.get(key_text, persona, model_name)
+        tracing.annotate(cached=cached is not None)
+        if cached is not None:
+            await reply.feed(cached)
+            return await reply.finish()
+
+        await self.admission.check(
+            interaction.user.id, interaction.guild.id if interaction.guild else None
+        )
+
+        async def notify(position):
+            await interaction.edit_original_response(
+                content=f"⏳ I'm a bit busy right now, you're #{position} in line."
+            )
+
+        async def generate():
+            if batch_instructions and self.batcher.accepts(key_text):
+                await reply.feed(
+                    await self.batcher.ask(
+                        batch_instructions,
+                        key_text,
+                        prompt,
+                        tier,
+                        channel_id=interaction.channel_id,
+                    )
+                )
+                return await reply.finish()
+            async with self.admission.slot(interaction.channel_id, on_queued=notify):
+                return await reply.consume(self.model.stream(prompt, tier=tier))
+
+        response_text, shared = await self.inflight.do(
+            make_key(key_text, persona, model_name), generate
+        )
+        tracing.annotate(coalesced=shared)
+        if shared:
+            await reply.feed(response_text)
+            return await reply.finish()
+        await self.cache.set(key_text, persona, model_name, response_text)
+        return response_text
 
     @app_commands.command(
         name="ask",
@@ -17,14 +82,36 @@ class Study(commands.Cog):
     )
     @app_commands.describe(question="The question you want to ask.")
     async def ask_command(self, interaction: discord.Interaction, question: str):
-        await interaction.response.defer(thinking=True)
+        with tracing.trace(
+            "ask", interaction_id=interaction.id, user_id=interaction.user.id
+        ):
+            await self._ask(interaction, question)
+
+    async def _ask(self, interaction: discord.Interaction, question: str):
+        with tracing.span("discord.defer"):
+            await interaction.response.defer(thinking=True)
         try:
+            quick_answer_instructions = (
+                "You are a helpful AI assistant. Provide a one to two sentence answer."
+            )
             quick_answer_prompt = f"You are a helpful AI assistant. Provide a one to two sentence answer to the following question: '{question}'"
-            response = self.model.generate_content(quick_answer_prompt)
-            await interaction.followup.send(response.text)
+            reply = StreamingReply(
+                interaction.edit_original_response, send_more=interaction.followup.send
+            )
+            await self._respond_cached(
+                interaction,
+                reply,
+                "ask",
+                question,
+                quick_answer_prompt,
+                batch_instructions=quick_answer_instructions,
+            )
+        except AdmissionError as e:
+            await interaction.followup.send(str(e))
         except Exception as e:
+            print(f"!!! ERROR: /ask failed: {e!r}")
             await interaction.followup.send(
-                f"Sorry, I couldn't answer that question right now. Error: {e}"
+                f"Sorry, I couldn't answer that question right now. {friendly_error(e)}"
             )
 
     @app_commands.command(
@@ -33,7 +120,14 @@ class Study(commands.Cog):
     )
     @app_commands.describe(prompt="The essay prompt you want an outline for.")
     async def outline_command(self, interaction: discord.Interaction, prompt: str):
-        await interaction.response.defer(thinking=True)
+        with tracing.trace(
+            "outline", interaction_id=interaction.id, user_id=interaction.user.id
+        ):
+            await self._outline(interaction, prompt)
+
+    async def _outline(self, interaction: discord.Interaction, prompt: str):
+        with tracing.span("discord.defer"):
+            await interaction.response.defer(thinking=True)
         try:
             outline_prompt = f"""
 You are an expert academic writing assistant. Your task is to generate a clear, structured, and helpful essay outline based on the user's prompt.
@@ -52,62 +146,137 @@ keep it under 4000 characters.
 
 The user's essay prompt is: '{prompt}'
 """
-            response = self.model.generate_content(outline_prompt)
-            response_text = response.text
 
-            char_limit = 4096
+            def outline_embed(text, index):
+                embed = discord.Embed(
+                    title=f'Essay Outline: "{prompt[:200]}"' if index == 0 else None,
+                    description=text,
+                    color=discord.Color.purple(),
+                )
+                if index == 0:
+                    embed.set_footer(
+                        text="Use this outline as a guide to structure your writing."
+                    )
+                return embed
 
-            embed = discord.Embed(
-                title=f'Essay Outline: "{prompt[:200]}"', color=discord.Color.purple()
+            reply = StreamingReply(
+                interaction.edit_original_response,
+                send_more=interaction.followup.send,
+                embed=outline_embed,
             )
-            embed.set_footer(
-                text="Use this outline as a guide to structure your writing."
+            await self._respond_cached(
+                interaction, reply, "outline", prompt, outline_prompt
             )
 
-            if len(response_text) <= char_limit:
-                embed.description = response_text
-                await interaction.followup.send(embed=embed)
-            else:
-                embed.description = "The generated outline is too long for a single message. Here it is in parts:"
-                await interaction.followup.send(embed=embed)
-
-                for i in range(0, len(response_text), char_limit):
-                    chunk = response_text[i : i + char_limit]
-                    await interaction.channel.send(chunk)
-
+        except AdmissionError as e:
+            await interaction.followup.send(str(e))
         except Exception as e:
+            print(f"!!! ERROR: /outline failed: {e!r}")
             await interaction.followup.send(
-                f"Sorry, I had trouble generating that outline. Error: {e}"
+                f"Sorry, I had trouble generating that outline. {friendly_error(e)}"
             )
 
-    @app_commands.command(name="pomodoro", description="Start a Pomodoro study timer.")
+    pomodoro = app_commands.Group(
+        name="pomodoro", description="Start, stop or check a Pomodoro study timer."
+    )
+
+    async def cog_load(self):
+        self.timers.register("pomodoro", self._pomodoro_timer_fired)
+        await self.timers.start()
+
+    async def cog_unload(self):
+        self.timers.stop()
+
+    async def _pomodoro_timer_fired(self, timer):
+        await self.bot.wait_until_ready()
+        channel = self.bot.get_channel(timer.channel_id)
+        if channel is None:
+            channel = await self.bot.fetch_channel(timer.channel_id)
+        mention = f"<@{timer.user_id}>"
+        break_minutes = timer.payload["break_minutes"]
+
+        if timer.payload["phase"] == "study":
+            await channel.send(
+                f"🎉 **Break Time, {mention}!**\n\nGreat work! Your **{break_minutes}-minute** break starts now. Relax and recharge!"
+            )
+            await self.timers.schedule(
+                "pomodoro",
+                break_minutes * 60,
+                timer.channel_id,
+                timer.user_id,
+                guild_id=timer.guild_id,
+                phase="break",
+                study_minutes=timer.payload["study_minutes"],
+                break_minutes=break_minutes,
+            )
+        else:
+            await channel.send(
+                f"💪 **Break's Over, {mention}!**\n\nTime to get back to it. You can start another session with `/pomodoro start`."
+            )
+
+    @pomodoro.command(name="start", description="Start a Pomodoro study timer.")
     @app_commands.describe(
         study_minutes="How long you want to study for (default: 25).",
         break_minutes="How long of a break you want (default: 5).",
     )
-    async def pomodoro_command(
+    async def pomodoro_start(
         self,
         interaction: discord.Interaction,
-        study_minutes: int = 25,
-        break_minutes: int = 5,
+        study_minutes: app_commands.Range[int, 1, 240] = 25,
+        break_minutes: app_commands.Range[int, 1, 60] = 5,
     ):
+        if self.timers.pending(kind="pomodoro", user_id=interaction.user.id):
+            await interaction.response.send_message(
+                "You already have a Pomodoro session running. Use `/pomodoro status` to check on it or `/pomodoro stop` to end it.",
+                ephemeral=True,
+            )
+            return
+
+        await self.timers.schedule(
+            "pomodoro",
+            study_minutes * 60,
+            interaction.channel_id,
+            interaction.user.id,
+            guild_id=interaction.guild_id,
+            phase="study",
+            study_minutes=study_minutes,
+            break_minutes=break_minutes,
+        )
         await interaction.response.send_message(
             f"🍅 **Pomodoro Timer Started!**\n\nTime to focus, {interaction.user.mention}! Your **{study_minutes}-minute** study session has begun. I'll let you know when it's time for a break."
         )
 
-        study_seconds = study_minutes * 60
-        break_seconds = break_minutes * 60
-
-        await asyncio.sleep(study_seconds)
-
-        await interaction.channel.send(
-            f"🎉 **Break Time, {interaction.user.mention}!**\n\nGreat work! Your **{break_minutes}-minute** break starts now. Relax and recharge!"
-        )
+    @pomodoro.command(name="stop", description="Stop your running Pomodoro timer.")
+    async def pomodoro_stop(self, interaction: discord.Interaction):
+        stopped = 0
+        for timer in self.timers.pending(kind="pomodoro", user_id=interaction.user.id):
+            stopped += await self.timers.cancel(timer.id)
+        if stopped:
+            await interaction.response.send_message(
+                f"🛑 Your Pomodoro session has been stopped, {interaction.user.mention}."
+            )
+        else:
+            await interaction.response.send_message(
+                "You don't have a Pomodoro session running.", ephemeral=True
+            )
 
-        await asyncio.sleep(break_seconds)
+    @pomodoro.command(
+        name="status", description="Show how much time is left on your Pomodoro timer."
+    )
+    async def pomodoro_status(self, interaction: discord.Interaction):
+        timers = self.timers.pending(kind="pomodoro", user_id=interaction.user.id)
+        if not timers:
+            await interaction.response.send_message(
+                "You don't have a Pomodoro session running. Start one with `/pomodoro start`.",
+                ephemeral=True,
+            )
+            return
 
-        await interaction.channel.send(
-            f"💪 **Break's Over, {interaction.user.mention}!**\n\nTime to get back to it. You can start another session with `/pomodoro`."
+        timer = timers[0]
+        phase = "study session" if timer.payload["phase"] == "study" else "break"
+        await interaction.response.send_message(
+            f"🍅 Your **{phase}** ends <t:{int(timer.due)}:R> (<t:{int(timer.due)}:t>).",
+            ephemeral=True,
         )
 
 
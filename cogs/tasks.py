@@ -1,9 +1,13 @@
 import os
 
+import aiohttp
 import discord
-import requests
 from discord.ext import commands, tasks
 
+from utils.github import GitHubPoller
+from utils.render import batch_embeds, split_markdown
+from utils.sharding import is_primary
+
 CHANGELOG_CHANNEL_ID = os.getenv("CHANGELOG_CHANNEL_ID")
 if CHANGELOG_CHANNEL_ID:
     try:
@@ -13,7 +17,12 @@ if CHANGELOG_CHANNEL_ID:
             "!!! WARNING: CHANGELOG_CHANNEL_ID is not a valid integer. Commit tracking will be disabled."
         )
         CHANGELOG_CHANNEL_ID = None
-GITHUB_REPO = os.getenv("GITHUB_REPO")
+GITHUB_REPOS = [
+    repo.strip()
+    for repo in (os.getenv("GITHUB_REPOS") or os.getenv("GITHUB_REPO") or "").split(",")
+    if repo.strip()
+]
+GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 
 
 def get_commit_emoji(commit_message):
@@ -38,81 +47,80 @@ def get_commit_emoji(commit_message):
         return "📝"
 
 
+def build_commit_embed(repo, commit_data):
+    """Builds the changelog embed for a single commit."""
+    commit = commit_data["commit"]
+    author = commit["author"]["name"]
+    message = commit["message"]
+    sha = commit_data["sha"]
+
+    emoji = get_commit_emoji(message)
+    title = message.splitlines()[0]
+    if len(message) > 3500:
+        message = split_markdown(message, 3500)[0] + "\n..."
+
+    embed = discord.Embed(
+        title=f"{emoji} {title}"[:256],
+        url=commit_data["html_url"],
+        description=f"```\n{message}\n```\nby {author}",
+        color=discord.Color.blue(),
+    )
+    embed.set_footer(text=f"{repo} · Commit: {sha[:7]}")
+    return embed
+
+
 class Tasks(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.last_commit_sha = None
-        if CHANGELOG_CHANNEL_ID and GITHUB_REPO:
+        self.github = GitHubPoller(token=GITHUB_TOKEN)
+        # With several worker processes only the primary announces commits.
+        if CHANGELOG_CHANNEL_ID and GITHUB_REPOS and is_primary():
             self.check_for_new_commits.start()
 
-    def cog_unload(self):
+    async def cog_unload(self):
         self.check_for_new_commits.cancel()
+        await self.github.close()
 
     @tasks.loop(minutes=10)
     async def check_for_new_commits(self):
-        if not CHANGELOG_CHANNEL_ID or not GITHUB_REPO:
+        if not CHANGELOG_CHANNEL_ID or not GITHUB_REPOS:
             return
 
-        try:
-            url = f"https://api.github.com/repos/{GITHUB_REPO}/commits"
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            commits = response.json()
-
-            if not commits:
-                return
-
-            latest_commit_sha = commits[0]["sha"]
+        channel = self.bot.get_channel(CHANGELOG_CHANNEL_ID)
+        if not channel:
+            print(
+                f"!!! ERROR: Could not find changelog channel with ID {CHANGELOG_CHANNEL_ID}"
+            )
+            return
 
-            if self.last_commit_sha is None:
-                self.last_commit_sha = latest_commit_sha
+        for repo in GITHUB_REPOS:
+            try:
+                new_commits, cursor = await self.github.fetch_new_commits(repo)
+                if new_commits:
+                    print(
+                        f"Found {len(new_commits)} new commit(s) in {repo}. Sending to #{channel.name}."
+                    )
+                    embeds = [
+                        build_commit_embed(repo, commit) for commit in new_commits
+                    ]
+                    for batch in batch_embeds(embeds):
+                        await channel.send(embeds=batch)
+                # Only now: if a send failed, the next poll announces them again.
+                if cursor is not None:
+                    await self.github.save_cursor(repo, cursor)
+
+            except aiohttp.ClientError as e:
                 print(
-                    f"Commit tracking initialized. Starting with commit: {latest_commit_sha[:7]}"
+                    f"!!! WARNING: Could not fetch commits for {repo} from GitHub: {e}"
+                )
+            except Exception as e:
+                print(
+                    f"!!! ERROR: An unexpected error occurred in the commit checker for {repo}: {e}"
                 )
-                return
-
-            if latest_commit_sha != self.last_commit_sha:
-                new_commits = []
-                for commit in commits:
-                    if commit["sha"] == self.last_commit_sha:
-                        break
-                    new_commits.append(commit)
 
-                if new_commits:
-                    channel = self.bot.get_channel(CHANGELOG_CHANNEL_ID)
-                    if channel:
-                        print(
-                            f"Found {len(new_commits)} new commit(s). Sending to #{channel.name}."
-                        )
-                        for commit_data in reversed(new_commits):
-                            commit = commit_data["commit"]
-                            author = commit["author"]["name"]
-                            message = commit["message"]
-                            sha = commit_data["sha"]
-                            url = commit_data["html_url"]
-
-                            emoji = get_commit_emoji(message)
-                            title = message.splitlines()[0]
-
-                            embed = discord.Embed(
-                                title=f"{emoji} {title}",
-                                url=url,
-                                description=f"```\n{message}\n```\nby {author}",
-                                color=discord.Color.blue(),
-                            )
-                            embed.set_footer(text=f"Commit: {sha[:7]}")
-                            await channel.send(embed=embed)
-                    else:
-                        print(
-                            f"!!! ERROR: Could not find changelog channel with ID {CHANGELOG_CHANNEL_ID}"
-                        )
-
-                self.last_commit_sha = latest_commit_sha
-
-        except requests.RequestException as e:
-            print(f"!!! WARNING: Could not fetch commits from GitHub: {e}")
-        except Exception as e:
-            print(f"!!! ERROR: An unexpected error occurred in the commit checker: {e}")
+    @check_for_new_commits.before_loop
+    async def before_check_for_new_commits(self):
+        await self.bot.wait_until_ready()
 
     @commands.command()
     @commands.is_owner()
@@ -0,0 +1,110 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+from dotenv import load_dotenv
+
+from utils.config import env_int
+
+# --- Configuration & Setup ---
+load_dotenv()
+DISCORD_BOT_TOKEN = os.getenv("DISCORD_BOT_TOKEN")
+WORKERS = env_int("WORKERS", 1)
+SHARD_COUNT = env_int("SHARD_COUNT", 0)
+RESTART_DELAY = 5
+
+
+def recommended_shard_count():
+    """Asks Discord how many shards this bot should run."""
+    request = urllib.request.Request(
+        "https://discord.com/api/v10/gateway/bot",
+        headers={
+            "Authorization": f"Bot {DISCORD_BOT_TOKEN}",
+            "User-Agent": "historiabot",
+        },
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response)["shards"]
+
+
+def shard_ranges(shard_count, workers):
+    """Splits shard IDs 0..shard_count-1 into `workers` contiguous ranges."""
+    workers = max(1, min(workers, shard_count))
+    base, extra = divmod(shard_count, workers)
+    ranges = []
+    start = 0
+    for worker_id in range(workers):
+        size = base + (1 if worker_id < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+
+def start_worker(worker_id, shard_ids, shard_count, worker_count):
+    env = dict(
+        os.environ,
+        WORKER_ID=str(worker_id),
+        WORKER_COUNT=str(worker_count),
+        SHARD_COUNT=str(shard_count),
+        SHARD_IDS=",".join(str(shard_id) for shard_id in shard_ids),
+    )
+    print(f"Starting worker {worker_id} with shards {shard_ids[0]}-{shard_ids[-1]}.")
+    return subprocess.Popen([sys.executable, "study_bot.py"], env=env)
+
+
+def main():
+    """Runs one bot process per shard range and restarts any that exit."""
+    if not DISCORD_BOT_TOKEN:
+        print("!!! FATAL ERROR: Missing DISCORD_BOT_TOKEN in .env file.")
+        sys.exit(1)
+
+    if WORKERS <= 1 and not SHARD_COUNT:
+        os.execv(sys.executable, [sys.executable, "study_bot.py"])
+
+    shard_count = SHARD_COUNT
+    if not shard_count:
+        shard_count = recommended_shard_count()
+        print(f"Discord recommends {shard_count} shard(s).")
+    ranges = shard_ranges(shard_count, WORKERS)
+    print(f"Launching {len(ranges)} worker(s) for {shard_count} shard(s).")
+
+    workers = {
+        worker_id: start_worker(worker_id, shard_ids, shard_count, len(ranges))
+        for worker_id, shard_ids in enumerate(ranges)
+    }
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in workers.values():
+            process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while not stopping:
+        time.sleep(1)
+        for worker_id, process in list(workers.items()):
+            if process.poll() is None or stopping:
+                continue
+            print(
+                f"!!! WARNING: Worker {worker_id} exited with code {process.returncode}. Restarting in {RESTART_DELAY}s."
+            )
+            time.sleep(RESTART_DELAY)
+            if stopping:
+                break
+            workers[worker_id] = start_worker(
+                worker_id, ranges[worker_id], shard_count, len(ranges)
+            )
+
+    for process in workers.values():
+        process.wait()
+
+
+if __name__ == "__main__":
+    main()
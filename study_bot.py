@@ -1,10 +1,27 @@
-import asyncio
-import os
+import time
 
-import discord
-import google.generativeai as genai
-from discord.ext import commands
-from dotenv import load_dotenv
+# Taken before anything else is imported so the startup report includes imports.
+PROCESS_STARTED = time.perf_counter()
+
+import asyncio  # noqa: E402
+import os  # noqa: E402
+
+import discord  # noqa: E402
+from discord.ext import commands  # noqa: E402
+from dotenv import load_dotenv  # noqa: E402
+
+from utils import metrics  # noqa: E402
+from utils.admission import get_admission_scheduler  # noqa: E402
+from utils.memory import LOW_MEMORY, MESSAGE_CACHE_SIZE  # noqa: E402
+from utils.model import get_gateway  # noqa: E402
+from utils.sharding import (  # noqa: E402
+    AUTO_SHARD,
+    SHARD_COUNT,
+    SHARD_IDS,
+    WORKER_ID,
+    is_primary,
+)
+from utils.startup import StartupTimer, sync_command_tree  # noqa: E402
 
 # --- Configuration & Setup ---
 print("Script started. Loading environment variables...")
@@ -16,24 +33,99 @@ if not DISCORD_BOT_TOKEN or not GEMMA_API_KEY:
     print("!!! FATAL ERROR: Missing DISCORD_BOT_TOKEN or GEMMA_API_KEY in .env file.")
     exit()
 print("... Environment variables loaded successfully.")
-
-try:
-    print("Configuring Google AI...")
-    genai.configure(api_key=GEMMA_API_KEY)
-    print("... Google AI configured successfully.")
-except Exception as e:
-    print(f"!!! FATAL ERROR: Could not configure Google AI. Error: {e}")
-    exit()
+# The Google AI SDK is imported and configured by the model gateway on the
+# first model call, keeping it off the startup path.
 
 # --- Discord Bot Setup ---
 intents = discord.Intents.default()
 intents.message_content = True
-bot = commands.Bot(command_prefix="!", intents=intents)
+# Replies fall back to the conversation store when a message has left the
+# cache, so the cache only needs to cover recent activity.
+options = {"max_messages": MESSAGE_CACHE_SIZE}
+if LOW_MEMORY:
+    # The bot never looks at members, voice or typing, so don't receive or
+    # cache them. Without member chunking, joining a guild costs little more
+    # than its channel list.
+    print(f"Low-memory mode: caching the last {MESSAGE_CACHE_SIZE} messages only.")
+    intents.voice_states = False
+    intents.typing = False
+    options.update(
+        member_cache_flags=discord.MemberCacheFlags.none(),
+        chunk_guilds_at_startup=False,
+    )
+if SHARD_COUNT:
+    print(f"Running shards {SHARD_IDS or 'all'} of {SHARD_COUNT} (worker {WORKER_ID}).")
+    bot = commands.AutoShardedBot(
+        command_prefix="!",
+        intents=intents,
+        shard_count=SHARD_COUNT,
+        shard_ids=SHARD_IDS,
+        **options,
+    )
+elif AUTO_SHARD:
+    bot = commands.AutoShardedBot(command_prefix="!", intents=intents, **options)
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents, **options)
+
+
+startup_timer = StartupTimer(started=PROCESS_STARTED)
+
+
+async def setup_hook():
+    startup_timer.mark("login")
+    # Only one worker needs to register the (global) slash commands.
+    if is_primary():
+        try:
+            await sync_command_tree(bot)
+        except Exception as e:
+            print(f"!!! ERROR: Could not sync slash commands. Error: {e}")
+        startup_timer.mark("command sync")
+
+
+bot.setup_hook = setup_hook
+
+
+@bot.event
+async def on_ready():
+    if not startup_timer.reported:
+        startup_timer.mark("ready")
+        startup_timer.report()
+        # Import the model SDK in a worker thread now instead of stalling the
+        # event loop on the first message.
+        await get_gateway().warm_up()
+
+
+# --- Metrics ---
+@bot.event
+async def on_app_command_completion(
+    interaction: discord.Interaction, command: discord.app_commands.Command
+):
+    metrics.COMMAND_LATENCY.observe(
+        (discord.utils.utcnow() - interaction.created_at).total_seconds(),
+        command=command.qualified_name,
+    )
+
+
+def setup_metrics():
+    """Hooks bot-wide metrics and starts the metrics endpoint if configured."""
+    metrics.instrument_http(bot.http)
+    metrics.GATEWAY_LATENCY.set_function(lambda: bot.latency)
+    metrics.MODEL_IN_FLIGHT.set_function(lambda: get_gateway().in_flight)
+    metrics.QUEUE_DEPTH.set_function(lambda: get_admission_scheduler().queue_depth)
+    asyncio.create_task(metrics.monitor_event_loop())
 
 
 # --- Main Bot Execution ---
 async def main():
     """Loads cogs and runs the bot."""
+    startup_timer.mark("import")
+    setup_metrics()
+    if metrics.METRICS_PORT:
+        # Each worker process serves its own metrics on the next port up.
+        port = metrics.METRICS_PORT + WORKER_ID
+        await metrics.start_server(port=port)
+        print(f"Metrics available at http://{metrics.METRICS_HOST}:{port}/metrics")
+
     print("Loading cogs...")
     for filename in os.listdir("./cogs"):
         if filename.endswith(".py"):
@@ -44,9 +136,11 @@ async def main():
                 print(f"!!! ERROR: Failed to load cog '{filename}'.")
                 print(f"     {e}")
     print("... Cogs loaded successfully.")
+    startup_timer.mark("cog load")
 
     print("\nAll setup complete. Attempting to connect to Discord...")
-    await bot.start(DISCORD_BOT_TOKEN)
+    await bot.login(DISCORD_BOT_TOKEN)
+    await bot.connect()
 
 
 if __name__ == "__main__":
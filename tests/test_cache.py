@@ -0,0 +1,31 @@
+import asyncio
+
+from utils.cache import ResponseCache, make_key
+from utils.storage import Database
+
+
+def test_empty_responses_are_never_served(tmp_path):
+    async def scenario():
+        db = Database(str(tmp_path / "bot.db"))
+        cache = ResponseCache(db=db, shared=False)
+        await cache.set("why?", "ask", "model", "  ")
+        assert await cache.get("why?", "ask", "model") is None
+
+        # A row written before empty responses were refused is a miss too.
+        await cache._ensure_schema()
+        await db.execute(
+            "INSERT INTO response_cache (key, persona, model, response, expires_at) VALUES (?, ?, ?, ?, ?)",
+            (
+                make_key("how?", "ask", "model"),
+                "ask",
+                "model",
+                "",
+                1e12,
+            ),
+        )
+        assert await cache.get("how?", "ask", "model") is None
+
+        await cache.set("why?", "ask", "model", "Because.")
+        assert await cache.get("why?", "ask", "model") == "Because."
+
+    asyncio.run(scenario())
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from bench import fakes
+from cogs.events import SUMMARY_BATCH_SIZE, Events
+from utils.storage import Database
+from utils.summaries import SummaryStore
+
+
+class CountingRouter:
+    def __init__(self):
+        self.calls = 0
+
+    def tier_for(self, persona=None, command=None):
+        return "large"
+
+    async def generate(self, prompt, *, tier=None, deadline=None):
+        self.calls += 1
+        return "A summary."
+
+    async def stream(self, prompt, *, tier=None, deadline=None):
+        self.calls += 1
+        yield "A summary."
+
+
+def test_recap_requests_are_not_summarized(tmp_path):
+    async def scenario():
+        world = fakes.FakeWorld(rest_latency=0)
+        events = Events(fakes.FakeBot(world))
+        events.model = CountingRouter()
+        events.summaries = SummaryStore(Database(str(tmp_path / "bot.db")))
+        guild = fakes.FakeGuild(fakes.next_id())
+        hall = fakes.FakeChannel(world, "debate-hall", guild)
+        starter = await hall.send("Debate: testing")
+        thread = await starter.create_thread(name="Debate: testing")
+        student = fakes.FakeUser(fakes.next_id(), "student")
+        mention = f"<@{world.bot_user.id}>"
+
+        thread.post(student, "Rome fell because of its economy.")
+        thread.post(student, f"{mention} summarize")
+        await events.summarize_debate(thread)
+        assert events.model.calls == 1
+
+        # Nothing new but the recap request: reuse the stored summary.
+        thread.post(student, f"{mention} recap please")
+        await events.summarize_debate(thread)
+        assert events.model.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_folded_batches_survive_a_later_failure(tmp_path):
+    class FailingStream(CountingRouter):
+        async def stream(self, prompt, *, tier=None, deadline=None):
+            raise RuntimeError("model down")
+            yield
+
+    async def scenario():
+        world = fakes.FakeWorld(rest_latency=0)
+        events = Events(fakes.FakeBot(world))
+        events.model = FailingStream()
+        events.summaries = SummaryStore(Database(str(tmp_path / "bot.db")))
+        guild = fakes.FakeGuild(fakes.next_id())
+        hall = fakes.FakeChannel(world, "debate-hall", guild)
+        starter = await hall.send("Debate: testing")
+        thread = await starter.create_thread(name="Debate: testing")
+        student = fakes.FakeUser(fakes.next_id(), "student")
+        posted = [
+            thread.post(student, f"Argument {i}.")
+            for i in range(SUMMARY_BATCH_SIZE + 10)
+        ]
+
+        with pytest.raises(RuntimeError):
+            await events.summarize_debate(thread)
+        summary, last_id = await events.summaries.get(thread.id)
+        assert summary == "A summary."
+        assert last_id == posted[SUMMARY_BATCH_SIZE - 1].id
+
+    asyncio.run(scenario())
@@ -0,0 +1,32 @@
+import asyncio
+
+from utils.github import GitHubPoller
+from utils.storage import Database
+
+
+class StubPoller(GitHubPoller):
+    def __init__(self, db, shas):
+        super().__init__(db=db)
+        self.shas = shas
+
+    async def _get(self, url, params=None, etag=None):
+        return [{"sha": sha} for sha in self.shas], f'"{self.shas[0]}"', None
+
+
+def test_cursor_moves_only_when_saved(tmp_path):
+    async def scenario():
+        poller = StubPoller(Database(str(tmp_path / "bot.db")), ["a"])
+        assert await poller.fetch_new_commits("org/repo") == ([], None)
+
+        poller.shas = ["c", "b", "a"]
+        commits, cursor = await poller.fetch_new_commits("org/repo")
+        assert [c["sha"] for c in commits] == ["b", "c"]
+
+        # Announcing failed: the same commits come back on the next poll.
+        commits, cursor = await poller.fetch_new_commits("org/repo")
+        assert [c["sha"] for c in commits] == ["b", "c"]
+
+        await poller.save_cursor("org/repo", cursor)
+        assert await poller.fetch_new_commits("org/repo") == ([], ("c", '"c"'))
+
+    asyncio.run(scenario())
@@ -0,0 +1,25 @@
+from utils.render import split_text
+
+
+def test_split_text_with_long_opening_fence_line():
+    text = "```" + "x" * 1500 + "\n" + "y " * 2000
+    chunks = split_text(text)
+    assert all(len(chunk) <= 2000 for chunk in chunks)
+    assert len(chunks) < 10
+
+
+def test_split_text_with_fence_line_longer_than_limit():
+    text = "```" + "x" * 2500 + "\n" + "y " * 2000
+    chunks = split_text(text)
+    assert all(len(chunk) <= 2000 for chunk in chunks)
+    assert len(chunks) < 10
+
+
+def test_split_text_reopens_split_code_block():
+    text = "```python\n" + "print(1)\n" * 400 + "```"
+    chunks = split_text(text)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert len(chunk) <= 2000
+        assert chunk.startswith("```python")
+        assert chunk.endswith("```")
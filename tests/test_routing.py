@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.model import ModelGateway
+from utils.routing import ModelRouter
+
+
+class SlowModel:
+    def __init__(self, latency):
+        self.latency = latency
+
+    async def generate_content_async(self, prompt, stream=False):
+        await asyncio.sleep(self.latency)
+        return type("Response", (), {"text": prompt})()
+
+
+def test_deadline_holds_while_every_slot_is_busy():
+    async def scenario():
+        gateway = ModelGateway(
+            max_concurrency=1, model_factory=lambda name: SlowModel(2.0)
+        )
+        router = ModelRouter(gateway, {"large": {"model": "slow"}}, retries=0)
+        busy = asyncio.create_task(gateway.generate("busy", model="slow"))
+        await asyncio.sleep(0)
+        started = time.perf_counter()
+        with pytest.raises(asyncio.TimeoutError):
+            await router.generate("hello", deadline=0.5)
+        elapsed = time.perf_counter() - started
+        busy.cancel()
+        return elapsed
+
+    assert asyncio.run(scenario()) < 1.0
+
+
+def test_no_hedge_when_gateway_is_full():
+    gateway = ModelGateway(max_concurrency=1)
+    router = ModelRouter(gateway, {"large": {"model": "slow"}}, hedge=True)
+    for _ in range(20):
+        router._window("large", "total").add(0.1)
+    assert router._hedge_delay("large", "total") is not None
+    gateway.in_flight = 1
+    assert router._hedge_delay("large", "total") is None
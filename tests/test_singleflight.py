@@ -0,0 +1,22 @@
+import asyncio
+
+from utils import metrics
+from utils.singleflight import SingleFlight
+
+
+def test_calls_are_counted_by_kind():
+    async def scenario():
+        group = SingleFlight("recap")
+
+        async def work():
+            await asyncio.sleep(0.01)
+            return "done"
+
+        return await asyncio.gather(*(group.do(1, work) for _ in range(3)))
+
+    before = metrics.SINGLEFLIGHT_CALLS._values.copy()
+    results = asyncio.run(scenario())
+    assert sorted(shared for _, shared in results) == [False, True, True]
+    after = metrics.SINGLEFLIGHT_CALLS._values
+    assert after[("recap", "leader")] - before.get(("recap", "leader"), 0) == 1
+    assert after[("recap", "coalesced")] - before.get(("recap", "coalesced"), 0) == 2
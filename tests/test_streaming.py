@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from utils.model import ModelGateway
+from utils.streaming import StreamingReply
+
+
+class BlockedChunk:
+    @property
+    def text(self):
+        raise ValueError("The candidate's finish_reason is SAFETY.")
+
+
+class BlockedModel:
+    async def generate_content_async(self, prompt, stream=False):
+        async def chunks():
+            yield BlockedChunk()
+
+        return chunks()
+
+
+def test_stream_without_text_raises():
+    async def scenario():
+        gateway = ModelGateway(model_factory=lambda name: BlockedModel())
+        return [chunk async for chunk in gateway.stream("hello")]
+
+    with pytest.raises(ValueError, match="SAFETY"):
+        asyncio.run(scenario())
+
+
+def test_finish_refuses_an_empty_response():
+    sent = []
+
+    async def send(**kwargs):
+        sent.append(kwargs)
+
+    async def scenario():
+        reply = StreamingReply(send)
+        await reply.feed("  ")
+        await reply.finish()
+
+    with pytest.raises(ValueError):
+        asyncio.run(scenario())
+    assert sent == []
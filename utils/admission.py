@@ -0,0 +1,305 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import time
+
+from utils import tracing
+from utils.config import env_float, env_int
+from utils.model import MODEL_MAX_CONCURRENCY
+from utils.sharding import shared_state
+from utils.storage import get_database
+
+ADMISSION_USER_RATE = env_float("ADMISSION_USER_RATE", 6.0)
+ADMISSION_USER_BURST = env_int("ADMISSION_USER_BURST", 3)
+ADMISSION_GUILD_RATE = env_float("ADMISSION_GUILD_RATE", 60.0)
+ADMISSION_GUILD_BURST = env_int("ADMISSION_GUILD_BURST", 20)
+ADMISSION_MAX_QUEUE = env_int("ADMISSION_MAX_QUEUE", 100)
+
+# Buckets that have refilled completely are forgotten once this many exist.
+_MAX_IDLE_BUCKETS = 10000
+
+
+class AdmissionError(Exception):
+    """Base class for requests the scheduler refuses; str() is user-facing."""
+
+
+class RateLimited(AdmissionError):
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(
+            f"You're sending requests a little too quickly. Try again in {max(1, round(retry_after))} second(s)."
+        )
+
+
+class Overloaded(AdmissionError):
+    def __init__(self):
+        super().__init__(
+            "I'm getting a lot of questions right now. Please try again in a minute."
+        )
+
+
+class TokenBucket:
+    """Classic token bucket: `capacity` tokens, refilled at `rate` per second."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        """Returns seconds until a token is available (0 if one is available now)."""
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    @property
+    def full(self):
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class MemoryBuckets:
+    """Token buckets held in this process."""
+
+    def __init__(self):
+        self._buckets = {}
+
+    async def take(self, requests):
+        """Spends a token from every (key, rate, capacity) bucket.
+
+        Returns 0 on success, or the seconds to wait if any bucket is empty
+        (in which case nothing is spent).
+        """
+        buckets = []
+        for key, rate, capacity in requests:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= _MAX_IDLE_BUCKETS:
+                    for idle in [k for k, b in self._buckets.items() if b.full]:
+                        del self._buckets[idle]
+                bucket = self._buckets[key] = TokenBucket(rate, capacity)
+            buckets.append(bucket)
+        wait = max(bucket.wait_time() for bucket in buckets)
+        if wait == 0:
+            for bucket in buckets:
+                bucket.take()
+        return wait
+
+
+class SharedBuckets:
+    """Token buckets kept in the shared database, so limits hold across workers."""
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS rate_buckets (
+        key TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated REAL NOT NULL
+    );
+    """
+
+    def __init__(self, db=None):
+        self.db = db or get_database()
+        self._ready = False
+
+    async def take(self, requests):
+        if not self._ready:
+            await self.db.executescript(self._SCHEMA)
+            self._ready = True
+
+        def _take(conn):
+            now = time.time()
+            # IMMEDIATE takes the write lock up front so concurrent workers
+            # cannot both spend the last token.
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                states = []
+                for key, rate, capacity in requests:
+                    row = conn.execute(
+                        "SELECT tokens, updated FROM rate_buckets WHERE key = ?",
+                        (key,),
+                    ).fetchone()
+                    tokens = (
+                        capacity
+                        if row is None
+                        else min(capacity, row[0] + (now - row[1]) * rate)
+                    )
+                    states.append((key, tokens, rate))
+                wait = max(
+                    (1 - tokens) / rate if tokens < 1 else 0.0
+                    for _, tokens, rate in states
+                )
+                if wait == 0:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                        [(key, tokens - 1, now) for key, tokens, _ in states],
+                    )
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            return wait
+
+        return await self.db.run(_take)
+
+
+class _Ticket:
+    __slots__ = ("channel_id", "finish", "future")
+
+    def __init__(self, channel_id, finish, future):
+        self.channel_id = channel_id
+        self.finish = finish
+        self.future = future
+
+
+class AdmissionScheduler:
+    """Decides when model requests may run.
+
+    Each request first spends a token from its user's and guild's buckets
+    (rates are per minute; shared through the database when several worker
+    processes run). It then waits for one of `max_active` slots; while
+    all slots are busy, waiting requests are ordered by weighted fair queueing
+    across channels, so one busy channel cannot starve the others. Once
+    `max_queue` requests are waiting, new ones are shed.
+    """
+
+    def __init__(
+        self,
+        max_active=MODEL_MAX_CONCURRENCY,
+        max_queue=ADMISSION_MAX_QUEUE,
+        user_rate=ADMISSION_USER_RATE,
+        user_burst=ADMISSION_USER_BURST,
+        guild_rate=ADMISSION_GUILD_RATE,
+        guild_burst=ADMISSION_GUILD_BURST,
+        channel_weights=None,
+        buckets=None,
+    ):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.user_rate = user_rate / 60
+        self.user_burst = user_burst
+        self.guild_rate = guild_rate / 60
+        self.guild_burst = guild_burst
+        self.channel_weights = channel_weights or {}
+        self.active = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rate_limited = 0
+        self.shed = 0
+        self.buckets = buckets or (
+            SharedBuckets() if shared_state() else MemoryBuckets()
+        )
+        self._queue = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish = {}
+
+    @property
+    def queue_depth(self):
+        return sum(1 for _, _, ticket in self._queue if not ticket.future.done())
+
+    async def check(self, user_id, guild_id=None):
+        """Spends one token for the user and guild, or raises RateLimited."""
+        requests = [(f"user:{user_id}", self.user_rate, self.user_burst)]
+        if guild_id is not None:
+            requests.append((f"guild:{guild_id}", self.guild_rate, self.guild_burst))
+        wait = await self.buckets.take(requests)
+        if wait > 0:
+            self.rate_limited += 1
+            raise RateLimited(wait)
+
+    def _release(self):
+        self.active -= 1
+        while self._queue and self.active < self.max_active:
+            finish, _, ticket = heapq.heappop(self._queue)
+            if ticket.future.done():
+                continue
+            self._virtual_time = finish
+            self.active += 1
+            ticket.future.set_result(None)
+        if not self._queue and self._last_finish:
+            # Finish tags at or behind the virtual clock no longer affect
+            # anyone's place in line, so idle channels can be forgotten.
+            self._last_finish = {
+                channel: finish
+                for channel, finish in self._last_finish.items()
+                if finish > self._virtual_time
+            }
+
+    @contextlib.asynccontextmanager
+    async def slot(self, channel_id, on_queued=None):
+        """Holds one of the active slots for the duration of the block.
+
+        If every slot is busy the caller is queued and `on_queued(position)`
+        is awaited with its 1-based place in line. Raises Overloaded when the
+        queue is full.
+        """
+        if self.active < self.max_active and not self._queue:
+            self.active += 1
+        else:
+            if self.queue_depth >= self.max_queue:
+                self.shed += 1
+                raise Overloaded()
+
+            weight = self.channel_weights.get(channel_id, 1.0)
+            start = max(self._virtual_time, self._last_finish.get(channel_id, 0.0))
+            finish = start + 1.0 / weight
+            self._last_finish[channel_id] = finish
+            ticket = _Ticket(
+                channel_id, finish, asyncio.get_running_loop().create_future()
+            )
+            heapq.heappush(self._queue, (finish, next(self._sequence), ticket))
+            self.queued += 1
+
+            try:
+                with tracing.span("admission.queued"):
+                    if on_queued is not None:
+                        position = sum(
+                            1
+                            for tag, _, other in self._queue
+                            if tag <= finish and not other.future.done()
+                        )
+                        await on_queued(position)
+                    await ticket.future
+            except BaseException:
+                if ticket.future.done() and not ticket.future.cancelled():
+                    self._release()
+                else:
+                    ticket.future.cancel()
+                raise
+
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self._release()
+
+    @contextlib.asynccontextmanager
+    async def admit(self, user_id, guild_id, channel_id, on_queued=None):
+        """Rate-limits the requester, then holds a slot for the block."""
+        await self.check(user_id, guild_id)
+        async with self.slot(channel_id, on_queued=on_queued):
+            yield
+
+
+_scheduler = None
+
+
+def get_admission_scheduler():
+    """Returns the process-wide admission scheduler, creating it on first use."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = AdmissionScheduler()
+    return _scheduler
@@ -0,0 +1,191 @@
+import asyncio
+import json
+import re
+
+from utils import metrics, tracing
+from utils.admission import get_admission_scheduler
+from utils.config import env_float, env_int
+from utils.routing import get_router
+
+BATCH_WINDOW = env_float("BATCH_WINDOW", 0.0)
+BATCH_MAX_SIZE = env_int("BATCH_MAX_SIZE", 8)
+BATCH_MAX_CHARS = env_int("BATCH_MAX_CHARS", 300)
+
+_FENCED = re.compile(r"^```(?:json)?\s*(.*?)\s*```$", re.S)
+
+
+def build_batch_prompt(entries):
+    questions = json.dumps(
+        [
+            {
+                "id": entry.id,
+                "instructions": entry.instructions,
+                "question": entry.question,
+            }
+            for entry in entries
+        ],
+        ensure_ascii=False,
+        indent=1,
+    )
+    return f"""
+You will answer several independent questions from different people at once.
+Each one comes with its own instructions, which apply to that question only.
+
+--- QUESTIONS ---
+{questions}
+--- END QUESTIONS ---
+
+Respond with only a JSON object that maps each question's "id" to your answer as a string, for example {{"q1": "...", "q2": "..."}}. Do not add anything outside the JSON object.
+"""
+
+
+def parse_batch_answers(text):
+    """Returns {id: answer} from the model's reply, or {} if it isn't the expected JSON."""
+    text = text.strip()
+    fenced = _FENCED.match(text)
+    if fenced:
+        text = fenced.group(1)
+    try:
+        answers = json.loads(text)
+    except ValueError:
+        return {}
+    if not isinstance(answers, dict):
+        return {}
+    return {
+        str(key): value.strip()
+        for key, value in answers.items()
+        if isinstance(value, str) and value.strip()
+    }
+
+
+class _Entry:
+    __slots__ = ("id", "instructions", "question", "prompt", "channel_id", "future")
+
+    def __init__(self, id, instructions, question, prompt, channel_id, future):
+        self.id = id
+        self.instructions = instructions
+        self.question = question
+        self.prompt = prompt
+        self.channel_id = channel_id
+        self.future = future
+
+
+class MicroBatcher:
+    """Answers short questions that arrive close together with one model call.
+
+    Questions for the same tier are collected for up to `window` seconds (or
+    until `max_size` are waiting) and sent as a single prompt asking for JSON
+    answers keyed by question ID. Each batch holds one admission slot. If the
+    reply can't be parsed, or leaves a question out, those questions are
+    asked one by one instead. A `window` of 0 turns batching off.
+    """
+
+    def __init__(
+        self,
+        router=None,
+        admission=None,
+        window=BATCH_WINDOW,
+        max_size=BATCH_MAX_SIZE,
+        max_chars=BATCH_MAX_CHARS,
+    ):
+        self.router = router or get_router()
+        self.admission = admission or get_admission_scheduler()
+        self.window = window
+        self.max_size = max_size
+        self.max_chars = max_chars
+        self.batches = 0
+        self.batched = 0
+        self.fallbacks = 0
+        self._pending = {}
+        self._timers = {}
+        self._ids = 0
+
+    @property
+    def enabled(self):
+        return self.window > 0
+
+    def accepts(self, question):
+        """Whether `question` is short enough to be batched."""
+        return self.enabled and 0 < len(question) <= self.max_chars
+
+    async def ask(self, instructions, question, prompt, tier, channel_id=None):
+        """Returns the answer to `question`, possibly batched with others.
+
+        `prompt` is the full single-question prompt, used if the batch fails.
+        """
+        self._ids += 1
+        entry = _Entry(
+            f"q{self._ids}",
+            instructions,
+            question,
+            prompt,
+            channel_id,
+            asyncio.get_running_loop().create_future(),
+        )
+        pending = self._pending.setdefault(tier, [])
+        pending.append(entry)
+        if len(pending) >= self.max_size:
+            self._flush(tier)
+        elif tier not in self._timers:
+            self._timers[tier] = asyncio.get_running_loop().call_later(
+                self.window, self._flush, tier
+            )
+        with tracing.span("batch.wait"):
+            return await asyncio.shield(entry.future)
+
+    def _flush(self, tier):
+        timer = self._timers.pop(tier, None)
+        if timer is not None:
+            timer.cancel()
+        entries = self._pending.pop(tier, [])
+        if entries:
+            asyncio.get_running_loop().create_task(self._run(tier, entries))
+
+    async def _run(self, tier, entries):
+        if len(entries) == 1:
+            await self._ask_alone(tier, entries[0])
+            return
+        self.batches += 1
+        self.batched += len(entries)
+        metrics.MODEL_BATCH_SIZE.observe(len(entries))
+        try:
+            async with self.admission.slot(entries[0].channel_id):
+                text = await self.router.generate(
+                    build_batch_prompt(entries), tier=tier
+                )
+        except Exception as e:
+            for entry in entries:
+                entry.future.set_exception(e)
+            return
+
+        answers = parse_batch_answers(text)
+        missing = [entry for entry in entries if entry.id not in answers]
+        if missing:
+            self.fallbacks += len(missing)
+            print(
+                f"!!! WARNING: Batched answer was missing {len(missing)} of {len(entries)} question(s); asking them separately."
+            )
+        for entry in entries:
+            if entry.id in answers:
+                entry.future.set_result(answers[entry.id])
+        await asyncio.gather(*(self._ask_alone(tier, entry) for entry in missing))
+
+    async def _ask_alone(self, tier, entry):
+        try:
+            async with self.admission.slot(entry.channel_id):
+                entry.future.set_result(
+                    await self.router.generate(entry.prompt, tier=tier)
+                )
+        except Exception as e:
+            entry.future.set_exception(e)
+
+
+_batcher = None
+
+
+def get_batcher():
+    """Returns the process-wide micro-batcher, creating it on first use."""
+    global _batcher
+    if _batcher is None:
+        _batcher = MicroBatcher()
+    return _batcher
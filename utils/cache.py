@@ -0,0 +1,190 @@
+import hashlib
+import re
+import time
+from collections import OrderedDict
+
+from utils import metrics
+from utils.config import env_int
+from utils.memory import LOW_MEMORY
+from utils.sharding import shared_state
+from utils.storage import get_database
+
+CACHE_MAX_ENTRIES = env_int("CACHE_MAX_ENTRIES", 256 if LOW_MEMORY else 1024)
+CACHE_TTL = env_int("CACHE_TTL", 7 * 24 * 60 * 60)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS response_cache (
+    key TEXT PRIMARY KEY,
+    persona TEXT NOT NULL,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS response_cache_expires ON response_cache (expires_at);
+CREATE TABLE IF NOT EXISTS bot_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Bumped by every purge so other workers know to drop their memory tier.
+_GENERATION_KEY = "response_cache_generation"
+
+
+def normalize_prompt(prompt):
+    """Lowercases and collapses whitespace so trivially different prompts match."""
+    return re.sub(r"\s+", " ", prompt).strip().casefold()
+
+
+def make_key(prompt, persona, model):
+    raw = "\x1f".join((model, persona, normalize_prompt(prompt)))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Model response cache with an in-memory LRU in front of SQLite.
+
+    Entries expire after `ttl` seconds. The memory tier holds at most
+    `max_entries` responses; the SQLite tier survives restarts. When several
+    workers share the database, a memory hit is only served after checking
+    that no worker has purged the cache since.
+    """
+
+    def __init__(
+        self, db=None, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, shared=None
+    ):
+        self.db = db or get_database()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared_state() if shared is None else shared
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._ready = False
+        self._writes = 0
+        self._generation = None
+
+    async def _ensure_schema(self):
+        if not self._ready:
+            await self.db.executescript(_SCHEMA)
+            self._ready = True
+
+    async def _check_generation(self):
+        """Drops the memory tier if any worker purged the cache since it was filled."""
+        await self._ensure_schema()
+        row = await self.db.fetchone(
+            "SELECT value FROM bot_state WHERE key = ?", (_GENERATION_KEY,)
+        )
+        generation = row[0] if row is not None else None
+        if generation != self._generation:
+            self._memory.clear()
+            self._generation = generation
+
+    def _remember(self, key, response, expires_at):
+        self._memory[key] = (response, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def get(self, prompt, persona, model):
+        """Returns the cached response text, or None on a miss."""
+        key = make_key(prompt, persona, model)
+        now = time.time()
+
+        entry = self._memory.get(key)
+        if entry is not None and self.shared:
+            await self._check_generation()
+            entry = self._memory.get(key)
+        if entry is not None:
+            if entry[1] > now and entry[0].strip():
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                metrics.CACHE_LOOKUPS.inc(result="memory_hit")
+                return entry[0]
+            del self._memory[key]
+
+        await self._ensure_schema()
+        row = await self.db.fetchone(
+            "SELECT response, expires_at FROM response_cache WHERE key = ? AND expires_at > ?",
+            (key, now),
+        )
+        if row is None or not row[0].strip():
+            # An empty answer (stored before empty responses were refused)
+            # would leave the user without a reply.
+            self.misses += 1
+            metrics.CACHE_LOOKUPS.inc(result="miss")
+            return None
+        self.disk_hits += 1
+        metrics.CACHE_LOOKUPS.inc(result="disk_hit")
+        self._remember(key, row[0], row[1])
+        return row[0]
+
+    async def set(self, prompt, persona, model, response):
+        """Caches `response`; empty or whitespace-only text is never stored."""
+        if not response or not response.strip():
+            return
+        key = make_key(prompt, persona, model)
+        expires_at = time.time() + self.ttl
+        self._remember(key, response, expires_at)
+
+        await self._ensure_schema()
+        await self.db.execute(
+            "INSERT OR REPLACE INTO response_cache (key, persona, model, response, expires_at) VALUES (?, ?, ?, ?, ?)",
+            (key, persona, model, response, expires_at),
+        )
+        self._writes += 1
+        if self._writes % 100 == 0:
+            await self.evict_expired()
+
+    async def evict_expired(self):
+        """Deletes expired rows from disk and returns how many were removed."""
+        await self._ensure_schema()
+        return await self.db.execute(
+            "DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),)
+        )
+
+    async def purge(self, persona=None):
+        """Removes every entry (or only one persona's) and returns the count."""
+        await self._ensure_schema()
+        await self.db.execute(
+            """
+            INSERT INTO bot_state (key, value) VALUES (?, '1')
+            ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+            """,
+            (_GENERATION_KEY,),
+        )
+        if persona is None:
+            self._memory.clear()
+            return await self.db.execute("DELETE FROM response_cache")
+
+        rows = await self.db.fetchall(
+            "SELECT key FROM response_cache WHERE persona = ?", (persona,)
+        )
+        for (key,) in rows:
+            self._memory.pop(key, None)
+        return await self.db.execute(
+            "DELETE FROM response_cache WHERE persona = ?", (persona,)
+        )
+
+    def stats(self):
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+
+_cache = None
+
+
+def get_cache():
+    """Returns the process-wide response cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache()
+    return _cache
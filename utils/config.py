@@ -0,0 +1,39 @@
+import os
+
+from dotenv import load_dotenv
+
+# Settings are read when modules are imported, which can happen before the
+# entry point loads the .env file, so load it here first.
+load_dotenv()
+
+
+def env_int(name, default):
+    """Reads an integer from the environment, falling back to the default."""
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        print(f"!!! WARNING: {name} is not a valid integer. Using {default}.")
+        return default
+
+
+def env_float(name, default):
+    """Reads a float from the environment, falling back to the default."""
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        print(f"!!! WARNING: {name} is not a valid number. Using {default}.")
+        return default
+
+
+def env_bool(name, default=False):
+    """Reads a true/false flag from the environment."""
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
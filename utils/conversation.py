@@ -0,0 +1,105 @@
+from collections import OrderedDict
+
+from utils.config import env_int
+from utils.memory import LOW_MEMORY
+
+CONVERSATION_MAX_CHANNELS = env_int(
+    "CONVERSATION_MAX_CHANNELS", 100 if LOW_MEMORY else 500
+)
+CONVERSATION_MAX_TURNS = env_int("CONVERSATION_MAX_TURNS", 50 if LOW_MEMORY else 200)
+CONVERSATION_TOKEN_BUDGET = env_int("CONVERSATION_TOKEN_BUDGET", 2000)
+
+
+def estimate_tokens(text):
+    """Rough token estimate (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+class Turn:
+    """One message in a conversation: who said it, what, and what it replied to."""
+
+    __slots__ = ("message_id", "author_id", "role", "content", "parent_id")
+
+    def __init__(self, message_id, author_id, role, content, parent_id=None):
+        self.message_id = message_id
+        self.author_id = author_id
+        self.role = role
+        self.content = content
+        self.parent_id = parent_id
+
+
+class ConversationStore:
+    """Bounded, per-channel memory of recent conversation turns.
+
+    Channels are evicted least-recently-used once more than `max_channels` are
+    tracked, and each channel keeps at most `max_turns` turns in a plain dict
+    (oldest first). Reply chains are rebuilt by following each turn's parent
+    link, without any API calls.
+    """
+
+    def __init__(
+        self,
+        max_channels=CONVERSATION_MAX_CHANNELS,
+        max_turns=CONVERSATION_MAX_TURNS,
+        token_budget=CONVERSATION_TOKEN_BUDGET,
+    ):
+        self.max_channels = max_channels
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.hits = 0
+        self.misses = 0
+        self._channels = OrderedDict()
+
+    def record(self, channel_id, message_id, author_id, role, content, parent_id=None):
+        turns = self._channels.get(channel_id)
+        if turns is None:
+            turns = self._channels[channel_id] = {}
+        self._channels.move_to_end(channel_id)
+        turns.pop(message_id, None)
+        turns[message_id] = Turn(message_id, author_id, role, content, parent_id)
+
+        while len(turns) > self.max_turns:
+            del turns[next(iter(turns))]
+        while len(self._channels) > self.max_channels:
+            self._channels.popitem(last=False)
+
+    def get(self, channel_id, message_id):
+        turns = self._channels.get(channel_id)
+        turn = turns.get(message_id) if turns is not None else None
+        if turn is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._channels.move_to_end(channel_id)
+        return turn
+
+    def chain(self, channel_id, message_id, token_budget=None):
+        """Returns the reply chain ending at `message_id`, oldest turn first.
+
+        Older turns are dropped once the chain would exceed `token_budget`;
+        the turn being replied to is always included.
+        """
+        budget = token_budget or self.token_budget
+        turns = self._channels.get(channel_id) or {}
+        chain = []
+        used = 0
+        turn = turns.get(message_id)
+        while turn is not None:
+            used += estimate_tokens(turn.content)
+            if chain and used > budget:
+                break
+            chain.append(turn)
+            turn = turns.get(turn.parent_id) if turn.parent_id else None
+        chain.reverse()
+        return chain
+
+
+_store = None
+
+
+def get_conversation_store():
+    """Returns the process-wide conversation store, creating it on first use."""
+    global _store
+    if _store is None:
+        _store = ConversationStore()
+    return _store
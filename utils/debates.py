@@ -0,0 +1,57 @@
+import time
+
+from utils.storage import get_database
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS debate_threads (
+    thread_id INTEGER PRIMARY KEY,
+    guild_id INTEGER,
+    created_at REAL NOT NULL
+);
+"""
+
+
+class DebateThreadIndex:
+    """Persisted set of the threads the bot opened for debates.
+
+    Lets the message handler recognise a debate thread without fetching the
+    thread's starter message.
+    """
+
+    def __init__(self, db=None):
+        self.db = db or get_database()
+        self._thread_ids = set()
+        self._ready = False
+
+    async def load(self):
+        if self._ready:
+            return
+        await self.db.executescript(_SCHEMA)
+        rows = await self.db.fetchall("SELECT thread_id FROM debate_threads")
+        self._thread_ids.update(thread_id for (thread_id,) in rows)
+        self._ready = True
+
+    def __contains__(self, thread_id):
+        return thread_id in self._thread_ids
+
+    def __len__(self):
+        return len(self._thread_ids)
+
+    async def add(self, thread_id, guild_id=None):
+        self._thread_ids.add(thread_id)
+        await self.load()
+        await self.db.execute(
+            "INSERT OR IGNORE INTO debate_threads (thread_id, guild_id, created_at) VALUES (?, ?, ?)",
+            (thread_id, guild_id, time.time()),
+        )
+
+
+_index = None
+
+
+def get_debate_index():
+    """Returns the process-wide debate thread index, creating it on first use."""
+    global _index
+    if _index is None:
+        _index = DebateThreadIndex()
+    return _index
@@ -0,0 +1,132 @@
+import aiohttp
+
+from utils import metrics
+from utils.config import env_int
+from utils.storage import get_database
+
+GITHUB_API_URL = "https://api.github.com"
+GITHUB_MAX_PAGES = env_int("GITHUB_MAX_PAGES", 10)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS github_cursors (
+    repo TEXT PRIMARY KEY,
+    last_sha TEXT NOT NULL,
+    etag TEXT
+);
+"""
+
+
+class GitHubPoller:
+    """Polls repositories for new commits using conditional requests.
+
+    The newest commit SHA and the commit list's ETag are persisted per repo.
+    Unchanged lists come back as free `304 Not Modified` responses; changed
+    lists are paginated back to the last seen SHA so no commit is skipped.
+    The cursor only moves once the caller has announced the new commits and
+    calls `save_cursor`, so a failed announcement is retried on the next poll.
+    """
+
+    def __init__(self, token=None, db=None, max_pages=GITHUB_MAX_PAGES):
+        self.db = db or get_database()
+        self.max_pages = max_pages
+        self.requests = 0
+        self.not_modified = 0
+        self._headers = {
+            "Accept": "application/vnd.github+json",
+            "User-Agent": "historiabot",
+        }
+        if token:
+            self._headers["Authorization"] = f"Bearer {token}"
+        self._session = None
+        self._ready = False
+
+    async def _ensure_schema(self):
+        if not self._ready:
+            await self.db.executescript(_SCHEMA)
+            self._ready = True
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers=self._headers, timeout=aiohttp.ClientTimeout(total=15)
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _get(self, url, params=None, etag=None):
+        headers = {"If-None-Match": etag} if etag else None
+        self.requests += 1
+        async with self._get_session().get(
+            url, params=params, headers=headers
+        ) as response:
+            metrics.GITHUB_REQUESTS.inc(status=response.status)
+            if response.status == 304:
+                self.not_modified += 1
+                return None, etag, None
+            response.raise_for_status()
+            next_link = response.links.get("next")
+            next_url = str(next_link["url"]) if next_link else None
+            return await response.json(), response.headers.get("ETag"), next_url
+
+    async def fetch_new_commits(self, repo):
+        """Returns (commits, cursor) for commits pushed to `repo` since the last poll.
+
+        Commits are oldest first. Pass `cursor` to `save_cursor` once they have
+        been handled; it is None when there is nothing to save. The first poll
+        of a repo only records its newest commit.
+        """
+        await self._ensure_schema()
+        row = await self.db.fetchone(
+            "SELECT last_sha, etag FROM github_cursors WHERE repo = ?", (repo,)
+        )
+        last_sha, etag = row if row is not None else (None, None)
+
+        commits, new_etag, next_url = await self._get(
+            f"{GITHUB_API_URL}/repos/{repo}/commits",
+            params={"per_page": 100},
+            etag=etag if last_sha else None,
+        )
+        if commits is None or not commits:
+            return [], None
+        latest_sha = commits[0]["sha"]
+
+        if last_sha is None:
+            await self.save_cursor(repo, (latest_sha, new_etag))
+            print(
+                f"Commit tracking initialized for {repo}. Starting with commit: {latest_sha[:7]}"
+            )
+            return [], None
+
+        new_commits = []
+        pages = 1
+        while True:
+            for commit in commits:
+                if commit["sha"] == last_sha:
+                    break
+                new_commits.append(commit)
+            else:
+                if next_url and pages < self.max_pages:
+                    commits, _, next_url = await self._get(next_url)
+                    pages += 1
+                    continue
+                if new_commits:
+                    print(
+                        f"!!! WARNING: Could not find commit {last_sha[:7]} in the last {len(new_commits)} commit(s) of {repo}; it may have been force-pushed away."
+                    )
+            break
+
+        new_commits.reverse()
+        return new_commits, (latest_sha, new_etag)
+
+    async def save_cursor(self, repo, cursor):
+        """Records that commits up to `cursor` (from fetch_new_commits) are handled."""
+        last_sha, etag = cursor
+        await self._ensure_schema()
+        await self.db.execute(
+            "INSERT OR REPLACE INTO github_cursors (repo, last_sha, etag) VALUES (?, ?, ?)",
+            (repo, last_sha, etag),
+        )
@@ -0,0 +1,59 @@
+import os
+import tracemalloc
+
+from utils.config import env_bool, env_int
+
+LOW_MEMORY = env_bool("LOW_MEMORY", False)
+MESSAGE_CACHE_SIZE = env_int("MESSAGE_CACHE_SIZE", 200 if LOW_MEMORY else 1000)
+TRACEMALLOC_FRAMES = env_int("TRACEMALLOC_FRAMES", 1)
+
+# Allocations made by tracemalloc itself and by the import machinery are noise
+# when looking for what grows at runtime.
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def rss_bytes():
+    """Returns the process's resident memory in bytes, or None if unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def start_tracing(frames=TRACEMALLOC_FRAMES):
+    """Starts tracemalloc if needed. Returns False if it was already running."""
+    if tracemalloc.is_tracing():
+        return False
+    tracemalloc.start(frames)
+    return True
+
+
+def _short_path(filename):
+    for root in (os.getcwd(), "site-packages"):
+        index = filename.find(root)
+        if index != -1:
+            return filename[index + len(root) :].lstrip(os.sep)
+    return filename
+
+
+def top_allocations(count=10):
+    """Returns [(where, bytes, blocks), ...] for the lines holding the most memory.
+
+    Takes a tracemalloc snapshot, which walks every traced block; call it from
+    a worker thread.
+    """
+    snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+    top = []
+    for stat in snapshot.statistics("lineno")[:count]:
+        frame = stat.traceback[0]
+        top.append(
+            (f"{_short_path(frame.filename)}:{frame.lineno}", stat.size, stat.count)
+        )
+    return top
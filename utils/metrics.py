@@ -0,0 +1,316 @@
+import asyncio
+import contextlib
+import math
+import os
+import time
+
+from utils.config import env_int
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = env_int("METRICS_PORT", 0)
+
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+def _format_value(value):
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._functions = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def set_function(self, fn, **labels):
+        """Reads the value from `fn()` at scrape time instead of storing it."""
+        self._functions[self._key(labels)] = fn
+
+    def samples(self):
+        values = dict(self._values)
+        for key, fn in self._functions.items():
+            try:
+                values[key] = float(fn())
+            except Exception:
+                values[key] = math.nan
+        for key, value in values.items():
+            yield self.name, _format_labels(self.labelnames, key), value
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        counts = state[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        state[1] += value
+        state[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observes how long the `with` block takes, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        for key, (counts, total, count) in self._values.items():
+            for bound, bucket_count in zip(self.buckets, counts):
+                yield (
+                    f"{self.name}_bucket",
+                    _format_labels(
+                        self.labelnames, key, [("le", _format_value(bound))]
+                    ),
+                    bucket_count,
+                )
+            yield (
+                f"{self.name}_bucket",
+                _format_labels(self.labelnames, key, [("le", "+Inf")]),
+                count,
+            )
+            yield f"{self.name}_sum", _format_labels(self.labelnames, key), total
+            yield f"{self.name}_count", _format_labels(self.labelnames, key), count
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# --- Bot metrics ---
+COMMAND_LATENCY = histogram(
+    "historiabot_command_seconds",
+    "Time from a slash command being invoked to it completing.",
+    ("command",),
+)
+MESSAGE_LATENCY = histogram(
+    "historiabot_message_seconds",
+    "Time spent handling a message, by on_message path.",
+    ("path",),
+)
+MESSAGE_FILTER = counter(
+    "historiabot_message_filter_total",
+    "Messages seen by on_message: dropped without I/O, accepted without I/O, or escalated to an API lookup.",
+    ("result",),
+)
+MODEL_REQUESTS = counter(
+    "historiabot_model_requests_total", "Model calls started.", ("model",)
+)
+MODEL_ERRORS = counter(
+    "historiabot_model_errors_total", "Model calls that failed.", ("model", "error")
+)
+MODEL_LATENCY = histogram(
+    "historiabot_model_seconds", "Duration of successful model calls.", ("model",)
+)
+MODEL_FIRST_TOKEN = histogram(
+    "historiabot_model_first_token_seconds",
+    "Time until a streamed model call produced its first chunk.",
+    ("model",),
+)
+MODEL_TIER_REQUESTS = counter(
+    "historiabot_model_tier_requests_total",
+    "Model calls per routing tier, by outcome (ok, retry, fallback, error).",
+    ("tier", "outcome"),
+)
+MODEL_TIER_LATENCY = histogram(
+    "historiabot_model_tier_seconds",
+    "Duration of successful model calls per routing tier.",
+    ("tier",),
+)
+MODEL_TIER_TOKENS = counter(
+    "historiabot_model_tier_tokens_total",
+    "Estimated prompt and response tokens spent per routing tier.",
+    ("tier",),
+)
+MODEL_HEDGES = counter(
+    "historiabot_model_hedges_total",
+    "Hedged duplicate model calls started, and which call won.",
+    ("result",),
+)
+MODEL_BREAKER_OPEN = gauge(
+    "historiabot_model_breaker_open",
+    "Whether the circuit breaker for a model is open (1) or closed (0).",
+    ("model",),
+)
+MODEL_BREAKER_REJECTIONS = counter(
+    "historiabot_model_breaker_rejections_total",
+    "Model calls refused because the model's circuit breaker was open.",
+    ("model",),
+)
+MODEL_BATCH_SIZE = histogram(
+    "historiabot_model_batch_size",
+    "Questions answered by one batched model call.",
+    buckets=(2, 3, 4, 6, 8, 12, 16, 24, 32),
+)
+MODEL_IN_FLIGHT = gauge("historiabot_model_in_flight", "Model calls in flight.")
+QUEUE_DEPTH = gauge(
+    "historiabot_admission_queue_depth", "Requests waiting for a model slot."
+)
+SINGLEFLIGHT_CALLS = counter(
+    "historiabot_singleflight_total",
+    "Calls that ran shared work (leader) or joined one in flight (coalesced).",
+    ("kind", "result"),
+)
+CACHE_LOOKUPS = counter(
+    "historiabot_cache_lookups_total", "Response cache lookups.", ("result",)
+)
+DISCORD_REST_REQUESTS = counter(
+    "historiabot_discord_rest_requests_total",
+    "Discord REST API calls.",
+    ("method", "route", "status"),
+)
+DISCORD_REST_LATENCY = histogram(
+    "historiabot_discord_rest_seconds",
+    "Duration of Discord REST API calls.",
+    ("method",),
+)
+GITHUB_REQUESTS = counter(
+    "historiabot_github_requests_total", "GitHub API calls.", ("status",)
+)
+GATEWAY_LATENCY = gauge(
+    "historiabot_gateway_latency_seconds", "Discord gateway heartbeat latency."
+)
+EVENT_LOOP_LAG = histogram(
+    "historiabot_event_loop_lag_seconds",
+    "How late the event loop woke up a periodic sleep.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+
+def instrument_http(http):
+    """Counts and times every Discord REST call made through `http`."""
+    request = http.request
+
+    async def instrumented_request(route, **kwargs):
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            return await request(route, **kwargs)
+        except Exception as e:
+            status = str(getattr(e, "status", type(e).__name__))
+            raise
+        finally:
+            DISCORD_REST_LATENCY.observe(
+                time.perf_counter() - start, method=route.method
+            )
+            DISCORD_REST_REQUESTS.inc(
+                method=route.method, route=route.path, status=status
+            )
+
+    http.request = instrumented_request
+
+
+async def monitor_event_loop(interval=0.5):
+    """Records how far behind schedule the event loop wakes up."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - start - interval))
+
+
+async def start_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Serves the registry in Prometheus text format on http://host:port/metrics."""
+    from aiohttp import web
+
+    async def handle_metrics(request):
+        return web.Response(
+            text=REGISTRY.render(), content_type="text/plain", charset="utf-8"
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,226 @@
+import asyncio
+import contextlib
+import os
+import time
+
+from utils import metrics
+from utils.config import env_bool, env_float, env_int
+
+MODEL_NAME = "gemma-3-27b-it"
+MODEL_MAX_CONCURRENCY = env_int("MODEL_MAX_CONCURRENCY", 8)
+MODEL_TIMEOUT = env_float("MODEL_TIMEOUT", 60.0)
+MODEL_STREAMING = env_bool("MODEL_STREAMING", True)
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "models/text-embedding-004")
+
+_configured = False
+
+
+def _genai():
+    # Imported on first use: the SDK is slow to import and only needed once
+    # someone actually talks to the bot.
+    import google.generativeai as genai
+
+    global _configured
+    if not _configured:
+        genai.configure(api_key=os.getenv("GEMMA_API_KEY"))
+        _configured = True
+    return genai
+
+
+def _default_model_factory(name):
+    return _genai().GenerativeModel(name)
+
+
+async def _default_embedder(model, texts, task_type):
+    genai = _genai()
+    if hasattr(genai, "embed_content_async"):
+        result = await genai.embed_content_async(
+            model=model, content=texts, task_type=task_type
+        )
+    else:
+        result = await asyncio.to_thread(
+            genai.embed_content, model=model, content=texts, task_type=task_type
+        )
+    return result["embedding"]
+
+
+class ModelGateway:
+    """Shared, non-blocking entry point for every model call made by the cogs."""
+
+    def __init__(
+        self,
+        model_name=MODEL_NAME,
+        max_concurrency=MODEL_MAX_CONCURRENCY,
+        timeout=MODEL_TIMEOUT,
+        model_factory=None,
+        embedder=None,
+    ):
+        self.model_name = model_name
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.in_flight = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._model_factory = model_factory or _default_model_factory
+        self._embedder = embedder or _default_embedder
+        self._models = {}
+
+    def get_model(self, name=None):
+        """Returns the (cached) model client for the given model name."""
+        name = name or self.model_name
+        if name not in self._models:
+            self._models[name] = self._model_factory(name)
+        return self._models[name]
+
+    async def warm_up(self):
+        """Creates the default model client off the event loop (importing the SDK)."""
+        await asyncio.to_thread(self.get_model)
+
+    @contextlib.asynccontextmanager
+    async def _slot(self, deadline):
+        # Waiting for a free slot counts against the caller's timeout, so a
+        # busy gateway can't stretch a request past its deadline.
+        loop = asyncio.get_running_loop()
+        await asyncio.wait_for(self._semaphore.acquire(), deadline - loop.time())
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def _call(self, model, prompt):
+        # Prefer the SDK's native async API; fall back to a worker thread so a
+        # synchronous client never blocks the event loop.
+        if hasattr(model, "generate_content_async"):
+            return await model.generate_content_async(prompt)
+        return await asyncio.to_thread(model.generate_content, prompt)
+
+    async def generate(self, prompt, *, model=None, timeout=None):
+        """Generates a completion and returns its text.
+
+        At most `max_concurrency` calls run at once; the rest wait their turn.
+        Raises asyncio.TimeoutError if waiting for a turn plus the call takes
+        longer than `timeout` seconds. Cancelling the awaiting task cancels the
+        underlying request.
+        """
+        name = model or self.model_name
+        client = self.get_model(name)
+        metrics.MODEL_REQUESTS.inc(model=name)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or self.timeout)
+        try:
+            async with self._slot(deadline):
+                start = time.perf_counter()
+                response = await asyncio.wait_for(
+                    self._call(client, prompt), deadline - loop.time()
+                )
+        except Exception as e:
+            metrics.MODEL_ERRORS.inc(model=name, error=type(e).__name__)
+            raise
+        metrics.MODEL_LATENCY.observe(time.perf_counter() - start, model=name)
+        return response.text
+
+    async def embed(
+        self,
+        texts,
+        *,
+        task_type="retrieval_document",
+        model=EMBEDDING_MODEL,
+        timeout=None
+    ):
+        """Returns one embedding vector per text, sharing the concurrency cap."""
+        metrics.MODEL_REQUESTS.inc(model=model)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or self.timeout)
+        try:
+            async with self._slot(deadline):
+                start = time.perf_counter()
+                vectors = await asyncio.wait_for(
+                    self._embedder(model, list(texts), task_type),
+                    deadline - loop.time(),
+                )
+        except Exception as e:
+            metrics.MODEL_ERRORS.inc(model=model, error=type(e).__name__)
+            raise
+        metrics.MODEL_LATENCY.observe(time.perf_counter() - start, model=model)
+        return vectors
+
+    async def stream(self, prompt, *, model=None, timeout=None):
+        """Yields the completion text in chunks as the model produces it.
+
+        Shares the concurrency cap with `generate`; `timeout` bounds the whole
+        stream, not each chunk. With MODEL_STREAMING disabled the full text is
+        yielded as a single chunk. Raises ValueError if the model produces no
+        text at all.
+        """
+        name = model or self.model_name
+        client = self.get_model(name)
+        metrics.MODEL_REQUESTS.inc(model=name)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or self.timeout)
+        try:
+            async with self._slot(deadline):
+                start = time.perf_counter()
+                if not MODEL_STREAMING or not hasattr(client, "generate_content_async"):
+                    response = await asyncio.wait_for(
+                        self._call(client, prompt), deadline - loop.time()
+                    )
+                    metrics.MODEL_LATENCY.observe(
+                        time.perf_counter() - start, model=name
+                    )
+                    yield response.text
+                    return
+
+                response = await asyncio.wait_for(
+                    client.generate_content_async(prompt, stream=True),
+                    deadline - loop.time(),
+                )
+                chunks = response.__aiter__()
+                first = True
+                skipped = None
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(
+                            chunks.__anext__(), deadline - loop.time()
+                        )
+                    except StopAsyncIteration:
+                        break
+                    try:
+                        text = chunk.text
+                    except ValueError as e:
+                        # Chunks without text parts (e.g. the final finish marker).
+                        skipped = e
+                        continue
+                    if text:
+                        if first:
+                            metrics.MODEL_FIRST_TOKEN.observe(
+                                time.perf_counter() - start, model=name
+                            )
+                            first = False
+                        yield text
+                if first:
+                    # No text at all (e.g. a safety stop): fail like the
+                    # non-streaming path does, with the finish reason if any.
+                    raise skipped or ValueError("The model returned an empty response.")
+                metrics.MODEL_LATENCY.observe(time.perf_counter() - start, model=name)
+        except Exception as e:
+            metrics.MODEL_ERRORS.inc(model=name, error=type(e).__name__)
+            raise
+
+
+_gateway = None
+
+
+def get_gateway():
+    """Returns the process-wide model gateway, creating it on first use."""
+    global _gateway
+    if _gateway is None:
+        _gateway = ModelGateway()
+    return _gateway
+
+
+def set_gateway(gateway):
+    """Replaces the process-wide model gateway (used for alternate backends)."""
+    global _gateway
+    _gateway = gateway
@@ -0,0 +1,247 @@
+import asyncio
+import hashlib
+import os
+
+from utils.config import env_float, env_int
+from utils.render import split_text
+from utils.routing import get_router
+from utils.storage import DATA_DIR, get_database
+
+NOTES_DIR = os.getenv("NOTES_DIR", "notes")
+NOTES_INDEX_DIR = os.path.join(DATA_DIR, "notes")
+NOTES_CHUNK_CHARS = env_int("NOTES_CHUNK_CHARS", 1200)
+NOTES_TOP_K = env_int("NOTES_TOP_K", 4)
+NOTES_MIN_SCORE = env_float("NOTES_MIN_SCORE", 0.3)
+NOTES_SEARCH_TIMEOUT = env_float("NOTES_SEARCH_TIMEOUT", 5.0)
+NOTES_EXTENSIONS = (".md", ".markdown", ".txt")
+EMBED_BATCH_SIZE = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS note_indexes (
+    persona TEXT PRIMARY KEY,
+    dim INTEGER NOT NULL,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS note_chunks (
+    persona TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    text TEXT NOT NULL,
+    active INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (persona, row)
+);
+CREATE INDEX IF NOT EXISTS note_chunks_source ON note_chunks (persona, source);
+"""
+
+
+def _read_notes(directory):
+    """Returns {relative path: text} for every notes file under `directory`."""
+    files = {}
+    for root, _, names in os.walk(directory):
+        for name in sorted(names):
+            if not name.lower().endswith(NOTES_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            with open(path, encoding="utf-8", errors="replace") as f:
+                files[os.path.relpath(path, directory)] = f.read()
+    return files
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _numpy():
+    # Imported on first use: NumPy is slow to import and only needed once
+    # someone asks a question in a channel with course notes.
+    import numpy
+
+    return numpy
+
+
+def _normalize(vectors):
+    np = _numpy()
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class NotesIndex:
+    """Embedding index over one persona's study notes.
+
+    Vectors live in a float32 file under data/notes that is memory-mapped
+    rather than loaded into the heap; the OS keeps its pages cached and can
+    drop them under memory pressure. Search is a brute-force scan that scores
+    every row of the mapped file. Chunk text and bookkeeping live in SQLite,
+    keyed by the vector's row. Re-ingesting only
+    embeds chunks that are new; chunks that disappeared are deactivated.
+    Embedding calls go through the model router, so they share its retries
+    and circuit breaker.
+    """
+
+    def __init__(self, persona, db=None, model=None, directory=NOTES_INDEX_DIR):
+        self.persona = persona
+        self.db = db or get_database()
+        self.model = model or get_router()
+        self.path = os.path.join(directory, f"{persona}.f32")
+        self.dim = None
+        self.rows = 0
+        self.version = None
+        self._vectors = None
+        self._active = None
+        self._passages = {}
+        self._lock = asyncio.Lock()
+        self._ready = False
+
+    def __len__(self):
+        return len(self._passages)
+
+    async def _ensure_schema(self):
+        if not self._ready:
+            await self.db.executescript(_SCHEMA)
+            self._ready = True
+
+    async def load(self):
+        """(Re)loads the index if another process or an ingest changed it."""
+        await self._ensure_schema()
+        state = await self.db.fetchone(
+            "SELECT dim, version FROM note_indexes WHERE persona = ?", (self.persona,)
+        )
+        if state is None or state[1] == self.version:
+            return
+        dim, version = state
+        np = _numpy()
+        rows = await self.db.fetchall(
+            "SELECT row, source, text, active FROM note_chunks WHERE persona = ?",
+            (self.persona,),
+        )
+        count = max((row for row, *_ in rows), default=-1) + 1
+        active = np.zeros(count, dtype=bool)
+        passages = {}
+        for row, source, text, is_active in rows:
+            if is_active:
+                active[row] = True
+                passages[row] = (source, text)
+        vectors = None
+        if count and os.path.exists(self.path):
+            vectors = np.memmap(
+                self.path, dtype=np.float32, mode="r", shape=(count, dim)
+            )
+        self.dim, self.version, self.rows = dim, version, count
+        self._vectors, self._active, self._passages = vectors, active, passages
+
+    async def _embed(self, texts, task_type, timeout=None):
+        vectors = []
+        for start in range(0, len(texts), EMBED_BATCH_SIZE):
+            batch = texts[start : start + EMBED_BATCH_SIZE]
+            vectors.extend(
+                await self.model.embed(batch, task_type=task_type, timeout=timeout)
+            )
+        return _normalize(vectors)
+
+    def _append_vectors(self, vectors):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "ab") as f:
+            # Drop rows left behind by an ingest that crashed before committing.
+            f.truncate(self.rows * self.dim * 4)
+            f.write(vectors.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def ingest(self, directory):
+        """Indexes the notes files under `directory`.
+
+        Returns (added, removed, unchanged) chunk counts.
+        """
+        async with self._lock:
+            await self.load()
+            files = await asyncio.to_thread(_read_notes, directory)
+            existing = await self.db.fetchall(
+                "SELECT row, source, digest FROM note_chunks WHERE persona = ? AND active = 1",
+                (self.persona,),
+            )
+            known = {(source, digest): row for row, source, digest in existing}
+
+            new_chunks = []
+            seen = set()
+            for source, text in files.items():
+                for chunk in split_text(text, NOTES_CHUNK_CHARS):
+                    key = (source, _digest(chunk))
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    if key not in known:
+                        new_chunks.append((source, key[1], chunk))
+            stale = [row for key, row in known.items() if key not in seen]
+
+            if new_chunks:
+                vectors = await self._embed(
+                    [chunk for _, _, chunk in new_chunks], "retrieval_document"
+                )
+                if self.dim is None:
+                    self.dim = vectors.shape[1]
+                elif vectors.shape[1] != self.dim:
+                    raise ValueError(
+                        f"Embedding size changed from {self.dim} to {vectors.shape[1]}; delete {self.path} and re-ingest."
+                    )
+                await asyncio.to_thread(self._append_vectors, vectors)
+
+            first_row = self.rows
+            await self.db.executemany(
+                "INSERT INTO note_chunks (persona, row, source, digest, text) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (self.persona, first_row + i, source, digest, chunk)
+                    for i, (source, digest, chunk) in enumerate(new_chunks)
+                ],
+            )
+            await self.db.executemany(
+                "UPDATE note_chunks SET active = 0 WHERE persona = ? AND row = ?",
+                [(self.persona, row) for row in stale],
+            )
+            if new_chunks or stale:
+                await self.db.execute(
+                    """
+                    INSERT INTO note_indexes (persona, dim, version) VALUES (?, ?, 1)
+                    ON CONFLICT(persona) DO UPDATE SET version = version + 1
+                    """,
+                    (self.persona, self.dim),
+                )
+                await self.load()
+            return len(new_chunks), len(stale), len(known) - len(stale)
+
+    @staticmethod
+    def _top(vectors, active, query, k, min_score):
+        np = _numpy()
+        scores = np.asarray(vectors @ query)
+        scores[~active] = -np.inf
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [
+            (float(scores[row]), int(row)) for row in best if scores[row] >= min_score
+        ]
+
+    async def search(self, query, k=NOTES_TOP_K, min_score=NOTES_MIN_SCORE):
+        """Returns up to `k` (score, source, text) passages relevant to `query`."""
+        await self.load()
+        if not self._passages or self._vectors is None:
+            return []
+        vector = (
+            await self._embed([query], "retrieval_query", timeout=NOTES_SEARCH_TIMEOUT)
+        )[0]
+        passages = self._passages
+        hits = await asyncio.to_thread(
+            self._top, self._vectors, self._active, vector, k, min_score
+        )
+        return [(score, *passages[row]) for score, row in hits]
+
+
+_indexes = {}
+
+
+def get_notes_index(persona):
+    """Returns the process-wide notes index for `persona`, creating it on first use."""
+    if persona not in _indexes:
+        _indexes[persona] = NotesIndex(persona)
+    return _indexes[persona]
@@ -0,0 +1,113 @@
+import re
+
+# Discord's limits: characters per message and per embed description, and
+# embeds and total embed characters per message.
+MESSAGE_LIMIT = 2000
+EMBED_LIMIT = 4096
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+
+# Places to break long text, best first. Each pattern matches just before
+# the break, so a chunk ends with the paragraph, line or sentence it holds.
+_BREAKS = (
+    re.compile(r"\n\s*\n"),  # between paragraphs
+    re.compile(r"\n(?=[ \t]*(?:[-*+]|\d+[.)]|#{1,6}|```|~~~)[ \t])|\n(?=```|~~~)"),
+    re.compile(r"\n"),  # between lines
+    re.compile(r"[.!?][)\"']?[ \t]+"),  # between sentences
+    re.compile(r"[ \t]+"),  # between words
+)
+_FENCE = re.compile(r"^[ \t]*(```|~~~)")
+
+
+def open_fence(text):
+    """Returns the opening line of a code block left open at the end of `text`."""
+    fence = None
+    for line in text.split("\n"):
+        match = _FENCE.match(line)
+        if not match:
+            continue
+        if fence is None:
+            fence = line.strip()
+        elif line.strip().startswith(fence[:3]):
+            fence = None
+    return fence
+
+
+def _break_point(text, limit):
+    """Finds the best place at or before `limit` to break `text`."""
+    window = text[:limit]
+    lowest = limit // 2
+    # Prefer breaking outside code blocks; only split one if nothing else fits.
+    for outside_code in (True, False):
+        for pattern in _BREAKS:
+            best = None
+            for match in pattern.finditer(window):
+                if match.end() >= lowest and (
+                    not outside_code or open_fence(window[: match.end()]) is None
+                ):
+                    best = match.end()
+            if best is not None:
+                return best
+    return limit
+
+
+def split_markdown(text, limit):
+    """Splits off the head of `text` that fits in `limit` characters.
+
+    Breaks between paragraphs, list items, lines, sentences or words, in
+    that order of preference, and avoids code blocks where it can. A code
+    block that has to be split is closed at the end of the head and reopened
+    at the start of the tail. Returns (head, tail).
+    """
+    if len(text) <= limit:
+        return text, ""
+    split = _break_point(text, limit)
+    head, tail = text[:split], text[split:]
+    fence = open_fence(head)
+    if fence is not None:
+        # Leave room to close the block.
+        split = _break_point(text, limit - 4)
+        if split <= len(open_fence(text[:split]) or "") + 1:
+            # The only break is right after a long opening fence line, and
+            # reopening the block there would give back a tail no shorter
+            # than `text`. Cut inside the block instead.
+            split = limit - 4
+        head, tail = text[:split], text[split:]
+        fence = open_fence(head)
+        if fence is not None:
+            if split > len(fence) + 1:
+                head = head.rstrip("\n") + "\n" + fence[:3]
+                tail = fence + "\n" + tail
+            else:
+                # The fence line alone doesn't fit; split without reopening.
+                head, tail = text[:limit], text[limit:]
+    return head.rstrip(), tail.lstrip("\n")
+
+
+def split_text(text, limit=MESSAGE_LIMIT):
+    """Splits `text` into markdown-aware chunks of at most `limit` characters."""
+    chunks = []
+    while text:
+        head, text = split_markdown(text, limit)
+        if head:
+            chunks.append(head)
+    return chunks
+
+
+def batch_embeds(embeds):
+    """Groups embeds into as few messages as Discord's per-message limits allow."""
+    batch = []
+    batch_chars = 0
+    for embed in embeds:
+        size = len(embed)
+        if batch and (
+            len(batch) == MAX_EMBEDS_PER_MESSAGE
+            or batch_chars + size > MAX_EMBED_CHARS_PER_MESSAGE
+        ):
+            yield batch
+            batch = []
+            batch_chars = 0
+        batch.append(embed)
+        batch_chars += size
+    if batch:
+        yield batch
@@ -0,0 +1,192 @@
+import asyncio
+import collections
+import random
+import time
+
+from utils import metrics
+from utils.config import env_bool, env_float, env_int
+
+MODEL_DEADLINE = env_float("MODEL_DEADLINE", 90.0)
+MODEL_RETRIES = env_int("MODEL_RETRIES", 2)
+MODEL_RETRY_BACKOFF = env_float("MODEL_RETRY_BACKOFF", 0.5)
+MODEL_HEDGE = env_bool("MODEL_HEDGE", True)
+MODEL_HEDGE_MIN_DELAY = env_float("MODEL_HEDGE_MIN_DELAY", 0.5)
+BREAKER_FAILURES = env_int("MODEL_BREAKER_FAILURES", 5)
+BREAKER_RESET = env_float("MODEL_BREAKER_RESET", 30.0)
+
+# Errors are matched by class name so the SDK's exception classes don't have
+# to be imported up front.
+TIMEOUT_ERRORS = {"TimeoutError", "DeadlineExceeded"}
+QUOTA_ERRORS = {"ResourceExhausted", "TooManyRequests"}
+SERVER_ERRORS = {"ServiceUnavailable", "InternalServerError", "BadGateway"}
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a model whose circuit breaker is open."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} is unavailable, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def is_timeout(error):
+    return isinstance(error, asyncio.TimeoutError) or (
+        type(error).__name__ in TIMEOUT_ERRORS
+    )
+
+
+def is_retryable(error):
+    """Whether retrying the same model might succeed (quota or server trouble)."""
+    return type(error).__name__ in QUOTA_ERRORS | SERVER_ERRORS
+
+
+def is_outage(error):
+    """Whether an error says the model service itself is unhealthy."""
+    return is_timeout(error) or is_retryable(error)
+
+
+def friendly_error(error):
+    """Explains a failed model request to users without exposing its internals."""
+    if isinstance(error, CircuitOpen):
+        return "The AI service is having trouble right now, so I'm giving it a short break. Please try again in a few minutes."
+    if is_timeout(error):
+        return "It took longer than it should have. Please try again in a moment."
+    if type(error).__name__ in QUOTA_ERRORS:
+        return (
+            "I've reached my usage limit for the moment. Please try again in a minute."
+        )
+    return "Please try again later."
+
+
+def backoff(attempt, base=MODEL_RETRY_BACKOFF):
+    """Exponential backoff with full jitter for the given retry attempt (0-based)."""
+    return random.uniform(0, base * 2**attempt)
+
+
+class CircuitBreaker:
+    """Stops calling a model after repeated outage errors.
+
+    After `failure_threshold` consecutive failures the breaker opens and calls
+    fail fast with CircuitOpen. Once `reset_timeout` seconds have passed, a
+    single trial call is let through; its outcome closes or reopens the breaker.
+    A trial that ends without an outcome (cancelled, or its stream abandoned)
+    must be given back with `release_trial` so the next call can try instead.
+    """
+
+    def __init__(
+        self, name, failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.rejected = 0
+        self._trial = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        """Raises CircuitOpen unless a call may go ahead.
+
+        Returns True if the call is the half-open trial.
+        """
+        if self.opened_at is None:
+            return False
+        waited = time.monotonic() - self.opened_at
+        if waited < self.reset_timeout or self._trial:
+            self.rejected += 1
+            metrics.MODEL_BREAKER_REJECTIONS.inc(model=self.name)
+            raise CircuitOpen(self.name, max(0.0, self.reset_timeout - waited))
+        self._trial = True
+        return True
+
+    def release_trial(self):
+        """Gives up the trial call without recording a success or a failure."""
+        self._trial = False
+
+    def record_success(self):
+        if self.opened_at is not None:
+            print(f"Model '{self.name}' recovered, closing its circuit breaker.")
+            metrics.MODEL_BREAKER_OPEN.set(0, model=self.name)
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                print(
+                    f"!!! WARNING: Model '{self.name}' failed {self.failures} times in a row, opening its circuit breaker."
+                )
+            self.opened_at = time.monotonic()
+            metrics.MODEL_BREAKER_OPEN.set(1, model=self.name)
+        self._trial = False
+
+
+class LatencyWindow:
+    """Recent latencies of one kind of call, used to pick a hedging delay."""
+
+    def __init__(self, size=200, min_samples=20):
+        self.samples = collections.deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, fraction):
+        """Returns the given percentile, or None until enough samples exist."""
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def hedged(start, delay, discard=None):
+    """Awaits `start()`, starting a duplicate if it hasn't finished after `delay`.
+
+    Returns the first successful result and cancels the other call;
+    `discard(result)` cleans up a second result that arrived at the same time.
+    Raises the last error if both calls fail. With `delay` None no duplicate
+    is started.
+    """
+    primary = asyncio.ensure_future(start())
+    tasks = {primary}
+    try:
+        if delay is None:
+            return await primary
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            tasks.add(asyncio.ensure_future(start()))
+            metrics.MODEL_HEDGES.inc(result="started")
+        error = None
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            winner = None
+            for task in done:
+                if task.exception() is not None:
+                    error = task.exception()
+                elif winner is None:
+                    winner = task
+                elif discard:
+                    await discard(task.result())
+            if winner is not None:
+                if len(tasks) > 1:
+                    metrics.MODEL_HEDGES.inc(
+                        result="primary_won" if winner is primary else "hedge_won"
+                    )
+                return winner.result()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
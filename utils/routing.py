@@ -0,0 +1,297 @@
+import asyncio
+import time
+
+from utils import metrics, tracing
+from utils.conversation import estimate_tokens
+from utils.model import EMBEDDING_MODEL, get_gateway
+from utils.resilience import (
+    MODEL_DEADLINE,
+    MODEL_HEDGE,
+    MODEL_HEDGE_MIN_DELAY,
+    MODEL_RETRIES,
+    CircuitBreaker,
+    CircuitOpen,
+    LatencyWindow,
+    backoff,
+    hedged,
+    is_outage,
+    is_retryable,
+)
+
+DEFAULT_TIER = "large"
+
+
+def should_fall_back(error):
+    """Whether another tier might answer: timeouts, quota and server errors, open breakers."""
+    return isinstance(error, CircuitOpen) or is_outage(error)
+
+
+class ModelRouter:
+    """Picks a model tier per persona or command and keeps calls to it healthy.
+
+    `tiers` maps a tier name to {"model": ..., "timeout": ..., "fallback": ...};
+    `persona_tiers` and `command_tiers` map personas and commands to tier names.
+    Each request gets an end-to-end deadline. Within it, quota and server
+    errors are retried with backoff, slow calls are hedged with a duplicate
+    after the tier's p95 latency, and a tier that keeps failing or has an open
+    circuit breaker hands the request to its fallback tier.
+    """
+
+    def __init__(
+        self,
+        gateway,
+        tiers,
+        persona_tiers=None,
+        command_tiers=None,
+        deadline=MODEL_DEADLINE,
+        retries=MODEL_RETRIES,
+        hedge=MODEL_HEDGE,
+    ):
+        self.gateway = gateway
+        self.tiers = tiers
+        self.persona_tiers = persona_tiers or {}
+        self.command_tiers = command_tiers or {}
+        self.deadline = deadline
+        self.retries = retries
+        self.hedge = hedge
+        self.requests = {name: 0 for name in tiers}
+        self.fallbacks = {name: 0 for name in tiers}
+        self.tokens = {name: 0 for name in tiers}
+        self.breakers = {}
+        self._latencies = {}
+
+    def tier_for(self, persona=None, command=None):
+        """Returns the tier for a command, else for a persona, else the default."""
+        if command in self.command_tiers:
+            return self.command_tiers[command]
+        return self.persona_tiers.get(persona, DEFAULT_TIER)
+
+    def model_for(self, tier):
+        return self.tiers[tier]["model"]
+
+    def breaker(self, model):
+        if model not in self.breakers:
+            self.breakers[model] = CircuitBreaker(model)
+        return self.breakers[model]
+
+    def _window(self, tier, kind):
+        key = (tier, kind)
+        if key not in self._latencies:
+            self._latencies[key] = LatencyWindow()
+        return self._latencies[key]
+
+    def _hedge_delay(self, tier, kind):
+        if not self.hedge:
+            return None
+        if self.gateway.in_flight >= self.gateway.max_concurrency:
+            # A duplicate would only queue for a slot, ahead of new requests.
+            return None
+        p95 = self._window(tier, kind).percentile(0.95)
+        return None if p95 is None else max(MODEL_HEDGE_MIN_DELAY, p95)
+
+    def _chain(self, tier):
+        """Yields `tier` followed by its fallbacks, each at most once."""
+        seen = set()
+        while tier and tier not in seen:
+            seen.add(tier)
+            yield tier
+            tier = self.tiers[tier].get("fallback")
+
+    def _record(self, tier, outcome, started, prompt, text=""):
+        self.requests[tier] += 1
+        tokens = estimate_tokens(prompt) + (estimate_tokens(text) if text else 0)
+        self.tokens[tier] += tokens
+        metrics.MODEL_TIER_REQUESTS.inc(tier=tier, outcome=outcome)
+        metrics.MODEL_TIER_TOKENS.inc(tokens, tier=tier)
+        if outcome == "ok":
+            metrics.MODEL_TIER_LATENCY.observe(time.perf_counter() - started, tier=tier)
+
+    def _observe_error(self, tier, error):
+        """Tells the tier's circuit breaker about a failed call."""
+        if is_outage(error):
+            self.breaker(self.model_for(tier)).record_failure()
+        elif not isinstance(error, CircuitOpen):
+            # The service answered, it just didn't like the request.
+            self.breaker(self.model_for(tier)).record_success()
+
+    async def _run(self, prompt, tier, deadline, call):
+        """Runs `call(tier, config, timeout)` with retries and tier fallback.
+
+        Returns (tier, started, trial, result) for the attempt that succeeded,
+        where `trial` says whether it was its breaker's half-open trial call.
+        """
+        loop = asyncio.get_running_loop()
+        expires = loop.time() + (deadline or self.deadline)
+        chain = list(self._chain(tier))
+        for position, name in enumerate(chain):
+            config = self.tiers[name]
+            breaker = self.breaker(config["model"])
+            for attempt in range(self.retries + 1):
+                remaining = expires - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                timeout = min(config.get("timeout") or self.gateway.timeout, remaining)
+                started = time.perf_counter()
+                trial = False
+                try:
+                    trial = breaker.before_call()
+                    with tracing.span(
+                        "model.call", tier=name, model=config["model"], attempt=attempt
+                    ):
+                        # A hedge starts late with the same timeout, so the
+                        # deadline is enforced around the whole call too.
+                        result = await asyncio.wait_for(
+                            call(name, config, timeout), remaining
+                        )
+                        return name, started, trial, result
+                except Exception as e:
+                    self._observe_error(name, e)
+                    delay = backoff(attempt)
+                    if (
+                        is_retryable(e)
+                        and attempt < self.retries
+                        and expires - loop.time() > delay
+                    ):
+                        self._record(name, "retry", started, prompt)
+                        await asyncio.sleep(delay)
+                        continue
+                    if position + 1 < len(chain) and should_fall_back(e):
+                        self.fallbacks[name] += 1
+                        self._record(name, "fallback", started, prompt)
+                        if not isinstance(e, CircuitOpen):
+                            print(
+                                f"!!! WARNING: Model tier '{name}' failed ({type(e).__name__}), trying the next tier."
+                            )
+                        break
+                    self._record(name, "error", started, prompt)
+                    raise
+                except BaseException:
+                    # Cancelled: no verdict on the model either way.
+                    if trial:
+                        breaker.release_trial()
+                    raise
+
+    async def generate(self, prompt, *, tier=DEFAULT_TIER, deadline=None):
+        """Generates a completion on `tier` within `deadline` seconds."""
+
+        async def call(name, config, timeout):
+            return await hedged(
+                lambda: self.gateway.generate(
+                    prompt, model=config["model"], timeout=timeout
+                ),
+                self._hedge_delay(name, "total"),
+            )
+
+        name, started, _, text = await self._run(prompt, tier, deadline, call)
+        self._window(name, "total").add(time.perf_counter() - started)
+        self.breaker(self.model_for(name)).record_success()
+        self._record(name, "ok", started, prompt, text)
+        return text
+
+    async def stream(self, prompt, *, tier=DEFAULT_TIER, deadline=None):
+        """Streams a completion on `tier` within `deadline` seconds.
+
+        Retries, hedging and fallback apply until the first chunk arrives;
+        a stream that breaks midway raises as usual.
+        """
+
+        async def call(name, config, timeout):
+            async def start():
+                chunks = self.gateway.stream(
+                    prompt, model=config["model"], timeout=timeout
+                )
+                try:
+                    first = await chunks.__anext__()
+                except StopAsyncIteration:
+                    first = ""
+                return first, chunks
+
+            async def discard(result):
+                await result[1].aclose()
+
+            return await hedged(start, self._hedge_delay(name, "first"), discard)
+
+        name, started, trial, (first, chunks) = await self._run(
+            prompt, tier, deadline, call
+        )
+        self._window(name, "first").add(time.perf_counter() - started)
+        parts = [first]
+        stream_started = time.perf_counter()
+        try:
+            if first:
+                yield first
+            async for chunk in chunks:
+                parts.append(chunk)
+                yield chunk
+            tracing.annotate(
+                model_stream_ms=round((time.perf_counter() - stream_started) * 1000, 1)
+            )
+        except Exception as e:
+            self._observe_error(name, e)
+            self._record(name, "error", started, prompt, "".join(parts))
+            raise
+        except BaseException:
+            # The consumer closed or cancelled the stream (for example after a
+            # failed Discord edit), which says nothing about the model.
+            if trial:
+                self.breaker(self.model_for(name)).release_trial()
+            raise
+        finally:
+            await chunks.aclose()
+        self.breaker(self.model_for(name)).record_success()
+        self._record(name, "ok", started, prompt, "".join(parts))
+
+    async def embed(self, texts, *, task_type, timeout=None):
+        """Embeds `texts` within `timeout` seconds, behind the embedding model's breaker.
+
+        Quota and server errors are retried with backoff while time remains;
+        there is no other tier to fall back to.
+        """
+        loop = asyncio.get_running_loop()
+        expires = loop.time() + (timeout or self.gateway.timeout)
+        breaker = self.breaker(EMBEDDING_MODEL)
+        for attempt in range(self.retries + 1):
+            trial = False
+            try:
+                trial = breaker.before_call()
+                with tracing.span("model.embed", attempt=attempt):
+                    vectors = await self.gateway.embed(
+                        texts,
+                        task_type=task_type,
+                        model=EMBEDDING_MODEL,
+                        timeout=max(0.001, expires - loop.time()),
+                    )
+            except Exception as e:
+                if is_outage(e):
+                    breaker.record_failure()
+                elif not isinstance(e, CircuitOpen):
+                    breaker.record_success()
+                delay = backoff(attempt)
+                if (
+                    is_retryable(e)
+                    and attempt < self.retries
+                    and expires - loop.time() > delay
+                ):
+                    await asyncio.sleep(delay)
+                    continue
+                raise
+            except BaseException:
+                if trial:
+                    breaker.release_trial()
+                raise
+            breaker.record_success()
+            return vectors
+
+
+_router = None
+
+
+def get_router():
+    """Returns the process-wide model router, creating it on first use."""
+    global _router
+    if _router is None:
+        # The routing tables live next to the personas they route.
+        from cogs.events import COMMAND_TIERS, MODEL_TIERS, PERSONA_TIERS
+
+        _router = ModelRouter(get_gateway(), MODEL_TIERS, PERSONA_TIERS, COMMAND_TIERS)
+    return _router
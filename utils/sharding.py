@@ -0,0 +1,46 @@
+import os
+
+from utils.config import env_bool, env_int
+
+# Set by launcher.py for each worker process; a plain `python study_bot.py`
+# run is a single unsharded worker.
+SHARD_COUNT = env_int("SHARD_COUNT", 0)
+AUTO_SHARD = env_bool("AUTO_SHARD", False)
+WORKER_ID = env_int("WORKER_ID", 0)
+WORKER_COUNT = env_int("WORKER_COUNT", 1)
+
+
+def _parse_shard_ids(value):
+    if not value:
+        return None
+    try:
+        return [int(shard_id) for shard_id in value.split(",") if shard_id.strip()]
+    except ValueError:
+        print("!!! WARNING: SHARD_IDS is not a comma-separated list of integers.")
+        return None
+
+
+SHARD_IDS = _parse_shard_ids(os.getenv("SHARD_IDS"))
+
+
+def is_primary():
+    """Whether this process runs the once-per-deployment jobs (polling, syncing)."""
+    return WORKER_ID == 0
+
+
+def shared_state():
+    """Whether state must be coordinated through the database across processes."""
+    return WORKER_COUNT > 1
+
+
+def shard_for_guild(guild_id, shard_count=SHARD_COUNT):
+    return (guild_id >> 22) % shard_count
+
+
+def owns_guild(guild_id):
+    """Whether this process's shards receive events for `guild_id` (None for DMs)."""
+    if guild_id is None:
+        return is_primary()
+    if not SHARD_COUNT or SHARD_IDS is None:
+        return True
+    return shard_for_guild(guild_id) in SHARD_IDS
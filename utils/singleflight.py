@@ -0,0 +1,65 @@
+import asyncio
+
+from utils import metrics
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one execution.
+
+    The first caller for a key (the leader) runs the work; anyone who asks for
+    the same key while it is still running waits for and shares its result.
+    `kind` labels the group's calls in metrics.
+    """
+
+    def __init__(self, kind="generation"):
+        self.kind = kind
+        self.leaders = 0
+        self.coalesced = 0
+        self._calls = {}
+
+    @property
+    def in_flight(self):
+        return len(self._calls)
+
+    async def do(self, key, fn):
+        """Returns (result, shared), running `fn()` only if no call for `key` is pending."""
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            metrics.SINGLEFLIGHT_CALLS.inc(kind=self.kind, result="coalesced")
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.leaders += 1
+        metrics.SINGLEFLIGHT_CALLS.inc(kind=self.kind, result="leader")
+        try:
+            result = await fn()
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        except BaseException:
+            future.set_exception(RuntimeError("The shared request was cancelled."))
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._calls[key]
+            if future.done() and not future.cancelled():
+                # Mark the exception as retrieved when nobody else was waiting.
+                future.exception()
+
+
+_groups = {}
+
+
+def get_singleflight(kind="generation"):
+    """Returns the process-wide single-flight group for `kind`, creating it if needed.
+
+    /ask and /outline generations share the "generation" group; debate
+    recaps use their own so their counts stay separate.
+    """
+    if kind not in _groups:
+        _groups[kind] = SingleFlight(kind)
+    return _groups[kind]
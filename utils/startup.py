@@ -0,0 +1,72 @@
+import hashlib
+import json
+import time
+
+from utils.storage import get_database
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bot_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class StartupTimer:
+    """Records how long each startup phase takes and prints a summary."""
+
+    def __init__(self, started=None):
+        self.started = started if started is not None else time.perf_counter()
+        self.phases = []
+        self._last = self.started
+        self.reported = False
+
+    def mark(self, phase):
+        """Ends `phase` now and starts timing the next one."""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def report(self):
+        total = self._last - self.started
+        breakdown = ", ".join(
+            f"{phase} {seconds:.2f}s" for phase, seconds in self.phases
+        )
+        print(f"Startup took {total:.2f}s ({breakdown}).")
+        self.reported = True
+
+
+def command_tree_hash(tree):
+    """Hashes the app command payload that `tree.sync()` would upload."""
+    payload = sorted(
+        (command.to_dict(tree) for command in tree.get_commands()),
+        key=lambda command: (command.get("type", 1), command["name"]),
+    )
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+async def sync_command_tree(bot, db=None):
+    """Syncs slash commands only when they changed since the last sync.
+
+    The hash of the last synced tree is kept in the database, so restarts and
+    reconnects skip the rate-limited global sync call when nothing changed.
+    Returns True if a sync was performed.
+    """
+    db = db or get_database()
+    await db.executescript(_SCHEMA)
+    key = f"command_tree_hash:{bot.application_id}"
+    digest = command_tree_hash(bot.tree)
+
+    row = await db.fetchone("SELECT value FROM bot_state WHERE key = ?", (key,))
+    if row is not None and row[0] == digest:
+        print("Slash commands unchanged since the last sync. Skipping sync.")
+        return False
+
+    print("Slash commands changed. Syncing...")
+    await bot.tree.sync()
+    await db.execute(
+        "INSERT OR REPLACE INTO bot_state (key, value) VALUES (?, ?)", (key, digest)
+    )
+    print("Slash commands synced successfully.")
+    return True
@@ -0,0 +1,83 @@
+import asyncio
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+DATA_DIR = os.getenv("DATA_DIR", "data")
+DATABASE_PATH = os.getenv("DATABASE_PATH", os.path.join(DATA_DIR, "historiabot.db"))
+
+
+class Database:
+    """Async wrapper around the SQLite file shared by the bot's stores.
+
+    All queries run on a single worker thread, so they never block the event
+    loop and never race each other on the same connection.
+    """
+
+    def __init__(self, path=DATABASE_PATH):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        return self._conn
+
+    async def run(self, fn, *args):
+        """Runs `fn(connection, *args)` on the database thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, lambda: fn(self._connect(), *args)
+        )
+
+    async def execute(self, sql, params=()):
+        """Executes a write statement and returns the number of affected rows."""
+
+        def _execute(conn):
+            with conn:
+                return conn.execute(sql, params).rowcount
+
+        return await self.run(_execute)
+
+    async def executemany(self, sql, rows):
+        def _executemany(conn):
+            with conn:
+                return conn.executemany(sql, rows).rowcount
+
+        return await self.run(_executemany)
+
+    async def executescript(self, script):
+        def _executescript(conn):
+            with conn:
+                conn.executescript(script)
+
+        await self.run(_executescript)
+
+    async def fetchone(self, sql, params=()):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchone())
+
+    async def fetchall(self, sql, params=()):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchall())
+
+    def close(self):
+        if self._conn is not None:
+            self._executor.submit(self._conn.close).result()
+            self._conn = None
+        self._executor.shutdown(wait=False)
+
+
+_database = None
+
+
+def get_database():
+    """Returns the process-wide database, creating it on first use."""
+    global _database
+    if _database is None:
+        _database = Database()
+    return _database
@@ -0,0 +1,126 @@
+import time
+
+from utils import tracing
+from utils.config import env_float
+from utils.render import (
+    EMBED_LIMIT,
+    MAX_EMBED_CHARS_PER_MESSAGE,
+    MAX_EMBEDS_PER_MESSAGE,
+    MESSAGE_LIMIT,
+    split_markdown,
+)
+
+STREAM_EDIT_INTERVAL = env_float("STREAM_EDIT_INTERVAL", 1.5)
+
+# Below this many characters of room left, a new message beats another embed.
+MIN_SECTION = 200
+
+
+class StreamingReply:
+    """Renders streamed model output into Discord messages as it arrives.
+
+    The first message is posted with `send` and later ones with `send_more`.
+    Text is split at markdown boundaries (see utils.render). As plain content
+    each message holds up to MESSAGE_LIMIT characters; with an `embed`
+    callback, `embed(text, index)` builds an embed for the index-th section
+    and each message packs as many sections as Discord allows (10 embeds,
+    6000 characters). The current message is edited at most once every
+    `interval` seconds to stay clear of Discord's edit rate limits.
+    """
+
+    def __init__(
+        self,
+        send,
+        send_more=None,
+        embed=None,
+        interval=STREAM_EDIT_INTERVAL,
+    ):
+        self._send = send
+        self._send_more = send_more or send
+        self._embed = embed
+        self.interval = interval
+        self.messages = []
+        self.text = ""
+        self._pending = ""
+        self._sections = []
+        self._first_index = 0
+        self._current = None
+        self._shown = None
+        self._last_edit = 0.0
+
+    def _render(self, texts):
+        if self._embed is None:
+            return {"content": texts[0]}
+        return {
+            "content": None,
+            "embeds": [
+                self._embed(text, self._first_index + i) for i, text in enumerate(texts)
+            ],
+        }
+
+    def _room(self):
+        """Characters the section being streamed may still grow to."""
+        if self._embed is None:
+            return 0 if self._sections else MESSAGE_LIMIT
+        if len(self._sections) >= MAX_EMBEDS_PER_MESSAGE:
+            return 0
+        index = self._first_index + len(self._sections)
+        used = sum(
+            len(self._embed(text, self._first_index + i))
+            for i, text in enumerate(self._sections)
+        )
+        overhead = len(self._embed("", index))
+        return min(EMBED_LIMIT, MAX_EMBED_CHARS_PER_MESSAGE - used - overhead)
+
+    async def _show(self):
+        texts = self._sections + ([self._pending] if self._pending.strip() else [])
+        if not texts or texts == self._shown:
+            return
+        kwargs = self._render(texts)
+        if self._current is None:
+            send = self._send if not self.messages else self._send_more
+            with tracing.span("discord.send"):
+                self._current = await send(**kwargs)
+            self.messages.append(self._current)
+        else:
+            with tracing.span("discord.edit"):
+                await self._current.edit(**kwargs)
+        self._shown = texts
+        self._last_edit = time.monotonic()
+
+    async def feed(self, chunk):
+        self.text += chunk
+        self._pending += chunk
+        while len(self._pending) > self._room():
+            room = self._room()
+            if room < MIN_SECTION and self._sections:
+                # This message is full: finish it and start the next one.
+                pending, self._pending = self._pending, ""
+                await self._show()
+                self._first_index += len(self._sections)
+                self._sections = []
+                self._current = None
+                self._shown = None
+                self._pending = pending
+                continue
+            head, self._pending = split_markdown(self._pending, room)
+            self._sections.append(head)
+        if time.monotonic() - self._last_edit >= self.interval:
+            await self._show()
+
+    async def finish(self):
+        """Flushes any remaining text and returns the full response.
+
+        Raises ValueError if there is nothing to show, so callers answer with
+        an error instead of leaving the user without a reply.
+        """
+        if not self.text.strip():
+            raise ValueError("The model returned an empty response.")
+        await self._show()
+        return self.text
+
+    async def consume(self, chunks):
+        """Feeds every chunk from an async iterator, then finishes."""
+        async for chunk in chunks:
+            await self.feed(chunk)
+        return await self.finish()
@@ -0,0 +1,52 @@
+import time
+
+from utils.storage import get_database
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS debate_summaries (
+    thread_id INTEGER PRIMARY KEY,
+    summary TEXT NOT NULL,
+    last_message_id INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class SummaryStore:
+    """Keeps the rolling summary of each debate thread and how far it reaches."""
+
+    def __init__(self, db=None):
+        self.db = db or get_database()
+        self._ready = False
+
+    async def _ensure_schema(self):
+        if not self._ready:
+            await self.db.executescript(_SCHEMA)
+            self._ready = True
+
+    async def get(self, thread_id):
+        """Returns (summary, last_message_id) for a thread, or (None, None)."""
+        await self._ensure_schema()
+        row = await self.db.fetchone(
+            "SELECT summary, last_message_id FROM debate_summaries WHERE thread_id = ?",
+            (thread_id,),
+        )
+        return row if row is not None else (None, None)
+
+    async def save(self, thread_id, summary, last_message_id):
+        await self._ensure_schema()
+        await self.db.execute(
+            "INSERT OR REPLACE INTO debate_summaries (thread_id, summary, last_message_id, updated_at) VALUES (?, ?, ?, ?)",
+            (thread_id, summary, last_message_id, time.time()),
+        )
+
+
+_store = None
+
+
+def get_summary_store():
+    """Returns the process-wide debate summary store, creating it on first use."""
+    global _store
+    if _store is None:
+        _store = SummaryStore()
+    return _store
@@ -0,0 +1,190 @@
+import asyncio
+import heapq
+import json
+import time
+
+from utils.config import env_int
+from utils.sharding import owns_guild
+from utils.storage import get_database
+
+TIMER_BATCH_SIZE = env_int("TIMER_BATCH_SIZE", 100)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS timers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    due REAL NOT NULL,
+    guild_id INTEGER,
+    channel_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS timers_user ON timers (user_id, kind);
+"""
+
+
+class Timer:
+    """A scheduled event: when it is due, where it fires, and for whom."""
+
+    __slots__ = ("id", "kind", "due", "guild_id", "channel_id", "user_id", "payload")
+
+    def __init__(self, id, kind, due, guild_id, channel_id, user_id, payload):
+        self.id = id
+        self.kind = kind
+        self.due = due
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.user_id = user_id
+        self.payload = payload
+
+
+class TimerService:
+    """Persists timers in SQLite and fires them from a single scheduler task.
+
+    Pending timers live in a min-heap ordered by due time. The scheduler sleeps
+    until the earliest one is due, then fires every due timer (up to
+    `batch_size` at a time) through the handler registered for its kind.
+    Timers survive restarts: `start()` re-arms everything still in the table
+    that belongs to this process (see `owns`), so sharded workers sharing the
+    database each fire only the timers of their own guilds.
+    """
+
+    def __init__(self, db=None, batch_size=TIMER_BATCH_SIZE, owns=owns_guild):
+        self.db = db or get_database()
+        self.batch_size = batch_size
+        self.owns = owns
+        self.fired = 0
+        self._handlers = {}
+        self._timers = {}
+        self._heap = []
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._ready = False
+
+    async def _ensure_schema(self):
+        if not self._ready:
+            await self.db.executescript(_SCHEMA)
+            self._ready = True
+
+    def register(self, kind, handler):
+        """Registers `await handler(timer)` to run when a timer of `kind` is due."""
+        self._handlers[kind] = handler
+
+    def _arm(self, timer):
+        self._timers[timer.id] = timer
+        heapq.heappush(self._heap, (timer.due, timer.id))
+        if self._heap[0][1] == timer.id:
+            self._wakeup.set()
+
+    async def start(self):
+        """Loads pending timers from disk and starts the scheduler task."""
+        if self._task is not None:
+            return
+        await self._ensure_schema()
+        rows = await self.db.fetchall(
+            "SELECT id, kind, due, guild_id, channel_id, user_id, payload FROM timers"
+        )
+        timers = [
+            Timer(*row[:6], json.loads(row[6])) for row in rows if self.owns(row[3])
+        ]
+        for timer in timers:
+            self._arm(timer)
+        if timers:
+            print(f"Re-armed {len(timers)} pending timer(s).")
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def schedule(
+        self, kind, delay, channel_id, user_id, guild_id=None, **payload
+    ):
+        """Persists and arms a timer firing `delay` seconds from now."""
+        await self._ensure_schema()
+        due = time.time() + delay
+
+        def _insert(conn):
+            with conn:
+                return conn.execute(
+                    "INSERT INTO timers (kind, due, guild_id, channel_id, user_id, payload) VALUES (?, ?, ?, ?, ?, ?)",
+                    (kind, due, guild_id, channel_id, user_id, json.dumps(payload)),
+                ).lastrowid
+
+        timer_id = await self.db.run(_insert)
+        timer = Timer(timer_id, kind, due, guild_id, channel_id, user_id, payload)
+        self._arm(timer)
+        return timer
+
+    async def cancel(self, timer_id):
+        """Cancels a pending timer. Returns False if it was not pending."""
+        if self._timers.pop(timer_id, None) is None:
+            return False
+        await self.db.execute("DELETE FROM timers WHERE id = ?", (timer_id,))
+        return True
+
+    def pending(self, kind=None, user_id=None):
+        """Returns pending timers, soonest first, optionally filtered."""
+        return sorted(
+            (
+                timer
+                for timer in self._timers.values()
+                if (kind is None or timer.kind == kind)
+                and (user_id is None or timer.user_id == user_id)
+            ),
+            key=lambda timer: timer.due,
+        )
+
+    def _pop_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+            _, timer_id = heapq.heappop(self._heap)
+            timer = self._timers.pop(timer_id, None)
+            if timer is not None:
+                due.append(timer)
+        return due
+
+    async def _fire(self, timer):
+        handler = self._handlers.get(timer.kind)
+        if handler is None:
+            print(f"!!! WARNING: No handler registered for '{timer.kind}' timers.")
+            return
+        try:
+            await handler(timer)
+        except Exception as e:
+            print(f"!!! ERROR: Timer {timer.id} ({timer.kind}) failed: {e}")
+
+    async def _run(self):
+        while True:
+            # Cancelled timers leave stale heap entries; skip past them.
+            while self._heap and self._heap[0][1] not in self._timers:
+                heapq.heappop(self._heap)
+
+            now = time.time()
+            batch = self._pop_due(now)
+            if batch:
+                await self.db.executemany(
+                    "DELETE FROM timers WHERE id = ?", [(t.id,) for t in batch]
+                )
+                self.fired += len(batch)
+                await asyncio.gather(*(self._fire(timer) for timer in batch))
+                continue
+
+            self._wakeup.clear()
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+_service = None
+
+
+def get_timer_service():
+    """Returns the process-wide timer service, creating it on first use."""
+    global _service
+    if _service is None:
+        _service = TimerService()
+    return _service
@@ -0,0 +1,213 @@
+import asyncio
+import collections
+import contextlib
+import contextvars
+import json
+import os
+import random
+import secrets
+import time
+
+from utils.config import env_bool, env_float, env_int
+from utils.memory import LOW_MEMORY
+from utils.storage import DATA_DIR
+
+TRACE_ENABLED = env_bool("TRACE_ENABLED", True)
+TRACE_SLOW_SECONDS = env_float("TRACE_SLOW_SECONDS", 5.0)
+TRACE_SAMPLE_RATE = env_float("TRACE_SAMPLE_RATE", 0.01)
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join(DATA_DIR, "traces.jsonl"))
+TRACE_MAX_BYTES = env_int("TRACE_MAX_BYTES", 10 * 1024 * 1024)
+TRACE_BACKUPS = env_int("TRACE_BACKUPS", 3)
+TRACE_QUEUE_SIZE = env_int("TRACE_QUEUE_SIZE", 1000)
+TRACE_RECENT = env_int("TRACE_RECENT", 50 if LOW_MEMORY else 200)
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+class Trace:
+    """One request's timeline: a name, attributes and the spans inside it."""
+
+    __slots__ = (
+        "id",
+        "name",
+        "attrs",
+        "started_at",
+        "start",
+        "duration",
+        "error",
+        "spans",
+    )
+
+    def __init__(self, name, attrs):
+        self.id = secrets.token_hex(8)
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.error = None
+        self.spans = []
+
+    def to_dict(self):
+        return {
+            "trace_id": self.id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "ms": round(self.duration * 1000, 1),
+            "error": self.error,
+            **self.attrs,
+            "spans": self.spans,
+        }
+
+
+class RotatingWriter:
+    """Appends lines to a file, rotating it to .1, .2, ... once it grows too big."""
+
+    def __init__(self, path, max_bytes=TRACE_MAX_BYTES, backups=TRACE_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def write(self, lines):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+            self._rotate()
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(line + "\n" for line in lines)
+
+
+class Tracer:
+    """Collects finished traces and writes the interesting ones to disk.
+
+    Traces slower than `slow_seconds` are always kept; the rest are kept with
+    probability `sample_rate`. Kept traces are queued and written to a
+    rotating JSONL file by a background task, so finishing a request never
+    waits on disk. When the queue is full, traces are dropped and counted.
+    """
+
+    def __init__(
+        self,
+        writer=None,
+        slow_seconds=TRACE_SLOW_SECONDS,
+        sample_rate=TRACE_SAMPLE_RATE,
+        queue_size=TRACE_QUEUE_SIZE,
+        recent=TRACE_RECENT,
+    ):
+        self.writer = writer or RotatingWriter(TRACE_FILE)
+        self.slow_seconds = slow_seconds
+        self.sample_rate = sample_rate
+        self.queue_size = queue_size
+        self.recent = collections.deque(maxlen=recent)
+        self.finished = 0
+        self.kept = 0
+        self.dropped = 0
+        self._queue = None
+        self._task = None
+
+    def _ensure_writer(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.queue_size)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._drain())
+
+    async def _drain(self):
+        while True:
+            lines = [await self._queue.get()]
+            while not self._queue.empty():
+                lines.append(self._queue.get_nowait())
+            try:
+                await asyncio.to_thread(self.writer.write, lines)
+            except OSError as e:
+                print(f"!!! WARNING: Could not write traces to {self.writer.path}: {e}")
+
+    def finish(self, trace):
+        self.finished += 1
+        self.recent.append(trace)
+        if trace.duration < self.slow_seconds and random.random() >= self.sample_rate:
+            return
+        self.kept += 1
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(json.dumps(trace.to_dict(), default=str))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def slowest(self, count=5):
+        return sorted(self.recent, key=lambda trace: trace.duration, reverse=True)[
+            :count
+        ]
+
+
+@contextlib.contextmanager
+def trace(name, **attrs):
+    """Traces the `with` block as one request; spans inside it are attached to it."""
+    if not TRACE_ENABLED:
+        yield None
+        return
+    current = Trace(name, attrs)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        current.duration = time.perf_counter() - current.start
+        get_tracer().finish(current)
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """Records how long the `with` block takes inside the current trace, if any."""
+    current = _current.get()
+    if current is None:
+        yield
+        return
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        record = {
+            "name": name,
+            "at_ms": round((start - current.start) * 1000, 1),
+            "ms": round((time.perf_counter() - start) * 1000, 1),
+            **attrs,
+        }
+        if error:
+            record["error"] = error
+        current.spans.append(record)
+
+
+def annotate(**attrs):
+    """Adds attributes to the current trace, if any."""
+    current = _current.get()
+    if current is not None:
+        current.attrs.update(attrs)
+
+
+_tracer = None
+
+
+def get_tracer():
+    """Returns the process-wide tracer, creating it on first use."""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer()
+    return _tracer